@@ -0,0 +1,57 @@
+"""Enforce one active appointment per doctor slot
+
+Revision ID: add_active_slot_unique_index
+Revises: add_hot_path_indexes
+Create Date: 2026-10-18
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_active_slot_unique_index'
+down_revision = 'add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+ACTIVE_SLOT_FILTER = "status IN ('scheduled', 'confirmed')"
+
+
+def upgrade():
+    # The index cannot be built while duplicate bookings exist. Refuse to
+    # continue rather than silently cancelling a patient's appointment.
+    duplicates = []
+    if not context.is_offline_mode():
+        duplicates = op.get_bind().execute(sa.text(
+            "SELECT doctor_id, appointment_date, appointment_time, COUNT(*) FROM appointments "
+            f"WHERE {ACTIVE_SLOT_FILTER} "
+            "GROUP BY doctor_id, appointment_date, appointment_time HAVING COUNT(*) > 1"
+        )).fetchall()
+    if duplicates:
+        raise RuntimeError(
+            f"{len(duplicates)} doctor slots have more than one active appointment; "
+            "cancel the duplicates before running this migration. First few: "
+            + ", ".join(f"doctor {d} on {day} at {slot}" for d, day, slot, _ in duplicates[:5])
+        )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_appointments_active_doctor_slot',
+            'appointments',
+            ['doctor_id', 'appointment_date', 'appointment_time'],
+            unique=True,
+            postgresql_where=sa.text(ACTIVE_SLOT_FILTER),
+            sqlite_where=sa.text(ACTIVE_SLOT_FILTER),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'uq_appointments_active_doctor_slot',
+            table_name='appointments',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,32 @@
+"""Add the appointment keyset pagination index
+
+Revision ID: add_appointment_keyset_index
+Revises: add_active_slot_unique_index
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_appointment_keyset_index'
+down_revision = 'add_active_slot_unique_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Appointment lists are paged by (appointment_date, appointment_time, id)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_appointments_date_time_id",
+            "appointments",
+            ["appointment_date", "appointment_time", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_appointments_date_time_id", table_name="appointments", postgresql_concurrently=True)
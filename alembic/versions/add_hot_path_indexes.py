@@ -0,0 +1,42 @@
+"""Add indexes for appointment, patient and catalogue hot paths
+
+Revision ID: add_hot_path_indexes
+Revises: add_agent_role
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_agent_role'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_appointments_doctor_slot", "appointments", ["doctor_id", "appointment_date", "appointment_time", "status"]),
+    ("ix_appointments_patient_status", "appointments", ["patient_id", "status"]),
+    ("ix_appointments_hospital_date", "appointments", ["hospital_id", "appointment_date"]),
+    ("ix_patients_phone", "patients", ["phone"]),
+    ("ix_hospitals_admin_id", "hospitals", ["admin_id"]),
+    ("ix_departments_hospital_id", "departments", ["hospital_id"]),
+    ("ix_doctors_department_id", "doctors", ["department_id"]),
+    ("ix_doctors_hospital_id", "doctors", ["hospital_id"]),
+]
+
+
+def upgrade():
+    # Build the indexes without blocking writes on PostgreSQL. CONCURRENTLY
+    # cannot run inside a transaction, hence the autocommit block.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
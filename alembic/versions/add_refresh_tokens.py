@@ -0,0 +1,45 @@
+"""Add refresh tokens and per-user token versions
+
+Revision ID: add_refresh_tokens
+Revises: add_appointment_keyset_index
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_refresh_tokens'
+down_revision = 'add_appointment_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("token_version", sa.Integer(), nullable=False, server_default=sa.text("0")))
+    op.add_column("users", sa.Column("tokens_revoked_at", sa.DateTime(), nullable=True))
+    # Workers poll for recent revocations by this column
+    op.create_index("ix_users_tokens_revoked_at", "users", ["tokens_revoked_at"])
+
+    op.create_table(
+        "refresh_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("token_hash", sa.String(64), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("revoked_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("token_hash", name="uq_refresh_tokens_token_hash"),
+    )
+    op.create_index("ix_refresh_tokens_id", "refresh_tokens", ["id"])
+    op.create_index("ix_refresh_tokens_user_id", "refresh_tokens", ["user_id"])
+
+
+def downgrade():
+    op.drop_index("ix_refresh_tokens_user_id", table_name="refresh_tokens")
+    op.drop_index("ix_refresh_tokens_id", table_name="refresh_tokens")
+    op.drop_table("refresh_tokens")
+    op.drop_index("ix_users_tokens_revoked_at", table_name="users")
+    op.drop_column("users", "tokens_revoked_at")
+    op.drop_column("users", "token_version")
@@ -1,52 +1,84 @@
-from typing import Generator, Optional
+from typing import Callable, Generator, Optional, TypeVar
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import jwt, ExpiredSignatureError, JWTError
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from app.db.session import get_db
-from app.models.user import User
+from app.api.tenant import TenantScope
+from app.db.session import get_db, get_async_db
 from app.core.config import settings
 from app.core.security import ALGORITHM
 from app.schemas.token import TokenPayload
+from app.services.principal import Principal
+from app.services.token_revocation import token_revocations
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+T = TypeVar("T")
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
+
+async def read_and_release(db: Session, read: Callable[[], T]) -> T:
+    """
+    Run ``read`` in the threadpool, then hand the session's connection back to
+    the pool. For async endpoints that next wait on something slow (bcrypt)
+    before touching the database again; loaded objects stay readable but are
+    detached, so re-add them to the session before changing them.
+    """
+    def run() -> T:
+        try:
+            return read()
+        finally:
+            db.close()
+    return await run_in_threadpool(run)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[ALGORITHM]
         )
         token_data = TokenPayload(**payload)
+    except ExpiredSignatureError:
+        # 401 for expired and revoked tokens tells the client to refresh
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     except (JWTError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = db.query(User).filter(User.id == token_data.sub).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    if not user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+    if token_data.sub is None or token_data.role is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Could not validate credentials",
+        )
+    # Authorized from the token's claims plus an in-memory revocation check; no query
+    if token_revocations.is_revoked(token_data.sub, token_data.ver):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Principal.from_token(token_data)
 
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
 def get_current_active_superuser(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if current_user.role != "super_admin":
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
@@ -55,8 +87,8 @@ def get_current_active_superuser(
 
 
 def get_current_hospital_admin(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if current_user.role not in ["super_admin", "hospital_admin"]:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
@@ -65,10 +97,16 @@ def get_current_hospital_admin(
 
 
 def get_current_doctor(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if current_user.role not in ["super_admin", "hospital_admin", "doctor"]:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def get_tenant_scope(
+    current_user: Principal = Depends(get_current_active_user),
+) -> TenantScope:
+    return TenantScope(current_user)
\ No newline at end of file
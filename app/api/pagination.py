@@ -0,0 +1,98 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+Lists are ordered by a stable, unique key (e.g. ``(appointment_date,
+appointment_time, id)``) and a page continues strictly after the key of the
+previous page's last row, so deep pages cost the same as the first one. The
+cursor is opaque to clients: base64 of the last key. The body stays a plain
+list; the cursor for the next page is sent in ``X-Next-Cursor`` (absent on the
+last page) and, when ``include_total=true`` is passed, the number of matching
+rows in ``X-Total-Count``. ``skip`` still works for old clients but is
+ignored once a cursor is given.
+"""
+import base64
+import json
+from datetime import date, time
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import literal, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# (column, parser for the cursor value) pairs, most significant first
+KeysetKeys = Sequence[Tuple[Any, Callable[[Any], Any]]]
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+    total: Optional[int]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, time)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, parsers: Sequence[Callable[[Any], Any]]) -> Tuple[Any, ...]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError("wrong number of cursor values")
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate_query(
+    query, keys: KeysetKeys, cursor: Optional[str], limit: int, skip: int = 0, include_total: bool = False
+) -> Page:
+    """One page of ``query`` ordered by ``keys``, which together must be unique"""
+    columns = [column for column, _ in keys]
+    total = query.order_by(None).count() if include_total else None
+
+    query = query.order_by(*columns)
+    if cursor:
+        values = decode_cursor(cursor, [parse for _, parse in keys])
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            bound = [literal(value, column.type) for column, value in zip(columns, values)]
+            query = query.filter(tuple_(*columns) > tuple_(*bound))
+    elif skip:
+        query = query.offset(skip)
+
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return Page(rows, next_cursor, total)
+
+
+def paginate_list(
+    items: List[Any],
+    cursor: Optional[str],
+    limit: int,
+    skip: int = 0,
+    include_total: bool = False,
+    key: Callable[[Any], int] = lambda item: item["id"],
+) -> Page:
+    """Same as ``paginate_query`` for in-memory rows already sorted by the integer ``key``"""
+    total = len(items) if include_total else None
+    if cursor:
+        (after,) = decode_cursor(cursor, [int])
+        items = [item for item in items if key(item) > after]
+    elif skip:
+        items = items[skip:]
+    next_cursor = encode_cursor([key(items[limit - 1])]) if len(items) > limit else None
+    return Page(items[:limit], next_cursor, total)
+
+
+def set_page_headers(response: Response, page: Page) -> None:
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    if page.total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(page.total)
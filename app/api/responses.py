@@ -0,0 +1,147 @@
+"""JSON responses for list endpoints without re-validating every row.
+
+With ``response_model`` set, FastAPI validates whatever an endpoint returns
+before encoding it: each ORM row is read attribute by attribute into a
+pydantic model, and models the endpoint already built are validated again. On
+large lists that dominates CPU. List endpoints instead select just the
+schema's columns (or take the catalogue cache's snapshots, which were
+validated when loaded), build plain dicts and encode them with orjson.
+Returning a ``Response`` makes FastAPI skip its own validation; the route's
+``response_model`` still documents the body in the OpenAPI schema.
+
+List endpoints also take ``fields`` (sparse fieldsets): only the named schema
+fields, plus ``id``, are selected from the database and returned.
+
+Catalogue and appointment reads go through ``conditional_response``, which
+adds an ``ETag`` (and ``Last-Modified`` for single rows) and a per-route
+``Cache-Control``, and answers ``304 Not Modified`` when the client's copy is
+still current.
+"""
+import hashlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import orjson
+from fastapi import HTTPException, Request, Response
+
+from app.api.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, Page, set_page_headers
+from app.core.config import settings
+
+# Cache-Control per kind of resource. Responses depend on the user's
+# permissions, so they are private to the client.
+CATALOGUE_CACHE_CONTROL = f"private, max-age={settings.CATALOGUE_HTTP_MAX_AGE_SECONDS}"
+APPOINTMENT_CACHE_CONTROL = "private, no-cache"
+
+
+def _default(value: Any) -> Any:
+    # Numeric columns; the schemas declare them as float
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
+
+
+def parse_fields(fields: Optional[str], schema) -> Optional[List[str]]:
+    """
+    Field names from a comma-separated ``fields`` parameter, in schema order and
+    always including ``id``; None (every field) when the parameter is absent
+    """
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(names - set(schema.__fields__))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return [name for name in schema.__fields__ if name in names or name == "id"]
+
+
+def schema_columns(model, schema, fields: Optional[List[str]] = None, extra: Sequence[str] = ()) -> list:
+    """
+    ``model``'s columns for ``fields`` (default: every field of ``schema``), to
+    select rows shaped like the schema; ``extra`` adds columns needed by the
+    query itself, such as keyset pagination keys
+    """
+    names = list(fields or schema.__fields__)
+    names += [name for name in extra if name not in names]
+    return [getattr(model, name) for name in names]
+
+
+def project(item: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """The ``fields`` of an already validated dict, e.g. a summary of a full snapshot"""
+    return {name: item[name] for name in fields}
+
+
+def page_response(items: List[Any], page: Page, fields: Optional[List[str]] = None) -> FastJSONResponse:
+    """
+    ``items`` (dicts, or rows selected with ``schema_columns``) with the page's
+    headers, reduced to ``fields`` when given
+    """
+    items = [item if isinstance(item, dict) else item._asdict() for item in items]
+    if fields:
+        items = [project(item, fields) for item in items]
+    response = FastJSONResponse(items)
+    set_page_headers(response, page)
+    return response
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison (RFC 9110 13.1.2): a W/ prefix is ignored
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().replace("W/", "", 1) == etag for tag in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole seconds
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(
+    request: Request, response: Response, cache_control: str, last_modified: Optional[datetime] = None
+) -> Response:
+    """
+    Add validators and ``cache_control`` to a rendered response, or replace it
+    with a 304 when ``If-None-Match`` (or, without it, ``If-Modified-Since``)
+    shows the client already has it.
+
+    The ETag is a hash of the body and the page headers (a list can gain a
+    next page or a new total while its rows stay the same) rather than of
+    ``updated_at`` values: those have one-second resolution on SQLite and do
+    not change when a row is deleted, so alone they could confirm a stale
+    list. For the same reason
+    ``last_modified`` (naive UTC, like ``updated_at``) should only be passed
+    for responses holding a single row.
+    """
+    digest = hashlib.blake2b(response.body, digest_size=16)
+    for header in (NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER):
+        digest.update(b"\0" + response.headers.get(header, "").encode())
+    etag = f'"{digest.hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        not_modified = bool(last_modified and if_modified_since and _not_modified_since(if_modified_since, last_modified))
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
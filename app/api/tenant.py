@@ -0,0 +1,56 @@
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import false, select
+
+from app.models.hospital import Hospital
+from app.services.catalogue_cache import HospitalSnapshot
+from app.services.principal import Principal
+
+# Above this many hospitals the filter uses a subquery instead of bound IDs
+MAX_IN_LIST = 500
+
+
+class TenantScope:
+    """
+    Hospitals a user may manage. Hospital admins are limited to the hospitals
+    they administer (taken from the access token's claims); every other
+    role is left to the endpoint's own checks.
+    """
+
+    def __init__(self, principal: Principal):
+        self.principal = principal
+        self.hospital_ids: Optional[frozenset] = (
+            principal.hospital_ids if principal.role == "hospital_admin" else None
+        )
+
+    @property
+    def is_restricted(self) -> bool:
+        return self.hospital_ids is not None
+
+    def allows(self, hospital_id: Optional[int]) -> bool:
+        return not self.is_restricted or hospital_id in self.hospital_ids
+
+    def check(self, hospital_id: Optional[int]) -> None:
+        """Raise 403 unless the object's hospital is in scope"""
+        if not self.allows(hospital_id):
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    def clause(self, hospital_column):
+        """SQL criterion limiting ``hospital_column`` to the hospitals in scope, or None"""
+        if not self.is_restricted:
+            return None
+        if not self.hospital_ids:
+            return false()
+        if len(self.hospital_ids) > MAX_IN_LIST:
+            managed = select(Hospital.id).where(Hospital.admin_id == self.principal.id)
+            return hospital_column.in_(managed)
+        return hospital_column.in_(sorted(self.hospital_ids))
+
+    def filter(self, query, hospital_column):
+        """Restrict a query on ``hospital_column`` to the hospitals in scope"""
+        clause = self.clause(hospital_column)
+        return query if clause is None else query.filter(clause)
+
+    def filter_snapshots(self, snapshots: Iterable[HospitalSnapshot]) -> List[HospitalSnapshot]:
+        return [s for s in snapshots if self.allows(s.hospital["id"])]
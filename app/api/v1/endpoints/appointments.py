@@ -1,66 +1,148 @@
-from typing import Any, List
-from datetime import datetime
-import uuid
+from typing import Any, List, Optional
+from datetime import date, datetime, time
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
 
 from app.api import deps
+from app.api.pagination import paginate_query
+from app.api.responses import (
+    APPOINTMENT_CACHE_CONTROL, FastJSONResponse, conditional_response, page_response, parse_fields, schema_columns
+)
+from app.api.tenant import TenantScope
+from app.db.session import SessionLocal
 from app.models.appointment import Appointment
+from app.models.department import Department
 from app.models.doctor import Doctor
-from app.models.hospital import Hospital
-from app.models.user import User
-from app.schemas.appointment import Appointment as AppointmentSchema, AppointmentCreate, AppointmentUpdate
+from app.models.patient import Patient
+from app.schemas.appointment import (
+    Appointment as AppointmentSchema, AppointmentBatchCreate, AppointmentBatchResult, AppointmentCreate,
+    AppointmentImport, AppointmentUpdate,
+)
+from app.schemas.bulk_import import BulkImportResult, BulkRowError
+from app.services.booking import (
+    SlotUnavailableError, generate_booking_reference, lock_and_find_conflicts, reserve_slot, reserve_slots
+)
+from app.services.bulk_import import BulkImporter, existing_ids, iter_chunks, iter_records
+from app.services.export import EXPORT_MEDIA_TYPES, iter_export
+from app.services.principal import Principal
 
 router = APIRouter()
 
+SLOT_FIELDS = {"appointment_date", "appointment_time", "duration_minutes", "status"}
+# Keyset order of appointment lists (see ix_appointments_date_time_id)
+APPOINTMENT_ORDER = [
+    (Appointment.appointment_date, date.fromisoformat),
+    (Appointment.appointment_time, time.fromisoformat),
+    (Appointment.id, int),
+]
+EXPORT_FIELDS = list(AppointmentSchema.__fields__)
 
-@router.get("/", response_model=List[AppointmentSchema])
-def read_appointments(
-    db: Session = Depends(deps.get_db),
-    hospital_id: int = None,
-    doctor_id: int = None,
-    patient_id: int = None,
-    status: str = None,
-    skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_user),
-) -> Any:
-    """
-    Retrieve appointments.
-    """
-    query = db.query(Appointment)
+
+def appointment_filters(
+    current_user: Principal,
+    scope: TenantScope,
+    hospital_id: Optional[int],
+    doctor_id: Optional[int],
+    patient_id: Optional[int],
+    status: Optional[str],
+) -> list:
+    """Criteria for the requested filters and the user's permissions"""
+    criteria = []
     
     # Apply filters
     if hospital_id:
-        query = query.filter(Appointment.hospital_id == hospital_id)
+        criteria.append(Appointment.hospital_id == hospital_id)
     
     if doctor_id:
-        query = query.filter(Appointment.doctor_id == doctor_id)
+        criteria.append(Appointment.doctor_id == doctor_id)
     
     if patient_id:
-        query = query.filter(Appointment.patient_id == patient_id)
+        criteria.append(Appointment.patient_id == patient_id)
     
     if status:
-        query = query.filter(Appointment.status == status)
+        criteria.append(Appointment.status == status)
     
     # Apply permission filters
-    if current_user.role == "hospital_admin":
-        hospitals = db.query(Hospital).filter(Hospital.admin_id == current_user.id).all()
-        hospital_ids = [h.id for h in hospitals]
-        query = query.filter(Appointment.hospital_id.in_(hospital_ids))
+    if scope.is_restricted:
+        criteria.append(scope.clause(Appointment.hospital_id))
     elif current_user.role == "doctor":
-        if not current_user.doctor_profile:
+        if not current_user.doctor_id:
             raise HTTPException(status_code=400, detail="User is not a doctor")
-        query = query.filter(Appointment.doctor_id == current_user.doctor_profile.id)
+        criteria.append(Appointment.doctor_id == current_user.doctor_id)
     elif current_user.role == "patient":
-        if not current_user.patient_profile:
+        if not current_user.patient_id:
             raise HTTPException(status_code=400, detail="User is not a patient")
-        query = query.filter(Appointment.patient_id == current_user.patient_profile.id)
+        criteria.append(Appointment.patient_id == current_user.patient_id)
+    
+    return criteria
+
+
+@router.get("/", response_model=List[AppointmentSchema])
+def read_appointments(
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    hospital_id: int = None,
+    doctor_id: int = None,
+    patient_id: int = None,
+    status: str = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_total: bool = Query(False, description="Send the number of matching rows in X-Total-Count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included); default all"),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
+) -> Any:
+    """
+    Retrieve appointments.
+    """
+    names = parse_fields(fields, AppointmentSchema)
+    criteria = appointment_filters(current_user, scope, hospital_id, doctor_id, patient_id, status)
+    # The keyset columns are always selected, for the next page's cursor
+    columns = schema_columns(
+        Appointment, AppointmentSchema, names, extra=[column.key for column, _ in APPOINTMENT_ORDER]
+    )
+    query = db.query(*columns).filter(*criteria)
     
-    appointments = query.offset(skip).limit(limit).all()
-    return appointments
+    page = paginate_query(query, APPOINTMENT_ORDER, cursor, limit, skip, include_total)
+    return conditional_response(request, page_response(page.items, page, names), APPOINTMENT_CACHE_CONTROL)
+
+
+@router.get("/export")
+def export_appointments(
+    export_format: str = Query("ndjson", alias="format", description="ndjson or csv"),
+    hospital_id: int = None,
+    doctor_id: int = None,
+    patient_id: int = None,
+    status: str = None,
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
+) -> Any:
+    """
+    Stream every matching appointment as NDJSON or CSV.
+    """
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    criteria = appointment_filters(current_user, scope, hospital_id, doctor_id, patient_id, status)
+    
+    def rows():
+        # The stream outlives the request's dependencies, so it uses its own session
+        db = SessionLocal()
+        try:
+            query = db.query(*[getattr(Appointment, name) for name in EXPORT_FIELDS]).filter(*criteria)
+            query = query.order_by(*[column for column, _ in APPOINTMENT_ORDER])
+            yield from iter_export(query, EXPORT_FIELDS, export_format)
+        finally:
+            db.close()
+    
+    return StreamingResponse(
+        rows(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="appointments.{export_format}"'},
+    )
 
 
 @router.post("/", response_model=AppointmentSchema)
@@ -68,47 +150,124 @@ def create_appointment(
     *,
     db: Session = Depends(deps.get_db),
     appointment_in: AppointmentCreate,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new appointment.
     """
-    # Check for double booking
-    existing_appointment = db.query(Appointment).filter(
-        and_(
-            Appointment.doctor_id == appointment_in.doctor_id,
-            Appointment.appointment_date == appointment_in.appointment_date,
-            Appointment.appointment_time == appointment_in.appointment_time,
-            Appointment.status.in_(["scheduled", "confirmed"])
-        )
-    ).first()
+    appointment = Appointment(
+        **appointment_in.dict(exclude={"booking_reference"}),
+        booking_reference=generate_booking_reference(),
+        created_by=str(current_user.id),
+    )
     
-    if existing_appointment:
+    # Reserve the slot; overlapping and concurrent bookings are rejected
+    try:
+        reserve_slot(db, appointment)
+    except SlotUnavailableError:
         raise HTTPException(
-            status_code=400,
+            status_code=409,
             detail="Doctor already has an appointment at this time"
         )
+    return appointment
+
+
+@router.post("/batch", response_model=AppointmentBatchResult)
+def create_appointments_batch(
+    *,
+    db: Session = Depends(deps.get_db),
+    batch_in: AppointmentBatchCreate,
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Book several appointments at once. In all_or_nothing mode a taken slot
+    fails the whole batch with 409; in best_effort mode the free slots are
+    booked and the taken ones listed in errors.
+    """
+    appointments = [
+        Appointment(
+            **appointment_in.dict(),
+            booking_reference=generate_booking_reference(),
+            created_by=str(current_user.id),
+        )
+        for appointment_in in batch_in.appointments
+    ]
     
-    # Generate unique booking reference
-    booking_reference = f"APPT-{uuid.uuid4().hex[:8].upper()}"
+    conflicts = reserve_slots(db, appointments, atomic=batch_in.mode == "all_or_nothing")
+    errors = [
+        BulkRowError(row=row, error="Doctor already has an appointment at this time")
+        for row, conflict in enumerate(conflicts, start=1) if conflict
+    ]
+    if errors and batch_in.mode == "all_or_nothing":
+        raise HTTPException(status_code=409, detail=[error.dict() for error in errors])
+    return {
+        "created": [a for a, conflict in zip(appointments, conflicts) if not conflict],
+        "errors": errors,
+    }
+
+
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_create_appointments(
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
+) -> Any:
+    """
+    Create many appointments from a JSON array or a CSV upload; invalid or
+    double-booked rows are reported and skipped.
+    """
+    def check(db: Session, appointments: List[AppointmentImport]) -> List[Optional[str]]:
+        doctors = dict(db.query(Doctor.id, Doctor.hospital_id).filter(
+            Doctor.id.in_({a.doctor_id for a in appointments})
+        ))
+        departments = dict(db.query(Department.id, Department.hospital_id).filter(
+            Department.id.in_({a.department_id for a in appointments})
+        ))
+        patient_ids = existing_ids(db, Patient.id, (a.patient_id for a in appointments))
+        problems = []
+        for appointment in appointments:
+            if not scope.allows(appointment.hospital_id):
+                problems.append("Not enough permissions")
+            elif doctors.get(appointment.doctor_id) != appointment.hospital_id:
+                problems.append("Doctor not found in this hospital")
+            elif departments.get(appointment.department_id) != appointment.hospital_id:
+                problems.append("Department not found in this hospital")
+            elif appointment.patient_id not in patient_ids:
+                problems.append("Patient not found")
+            else:
+                problems.append(None)
+        
+        # Slots are checked (under the booking locks) only for otherwise valid rows
+        candidates = [a for a, problem in zip(appointments, problems) if problem is None]
+        conflicts = iter(lock_and_find_conflicts(db, candidates))
+        return [
+            problem or ("Doctor already has an appointment at this time" if next(conflicts) else None)
+            for problem in problems
+        ]
     
-    appointment = Appointment(
-        **appointment_in.dict(),
-        booking_reference=booking_reference,
-        created_by=str(current_user.id),
+    importer = BulkImporter(
+        db, Appointment, AppointmentImport,
+        prepare=lambda appointment: {
+            **appointment.dict(),
+            "booking_reference": appointment.booking_reference or generate_booking_reference(),
+            "created_by": str(current_user.id),
+        },
+        check=check,
     )
-    db.add(appointment)
-    db.commit()
-    db.refresh(appointment)
-    return appointment
+    async for chunk in iter_chunks(iter_records(request)):
+        await run_in_threadpool(importer.import_chunk, chunk)
+    return importer.result()
 
 
 @router.get("/{appointment_id}", response_model=AppointmentSchema)
 def read_appointment(
     *,
+    request: Request,
     db: Session = Depends(deps.get_db),
     appointment_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Get appointment by ID.
@@ -118,18 +277,19 @@ def read_appointment(
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == appointment.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    if scope.is_restricted:
+        scope.check(appointment.hospital_id)
     elif current_user.role == "doctor":
-        if not current_user.doctor_profile or current_user.doctor_profile.id != appointment.doctor_id:
+        if not current_user.doctor_id or current_user.doctor_id != appointment.doctor_id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
     elif current_user.role == "patient":
-        if not current_user.patient_profile or current_user.patient_profile.id != appointment.patient_id:
+        if not current_user.patient_id or current_user.patient_id != appointment.patient_id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return appointment
+    return conditional_response(
+        request, FastJSONResponse(AppointmentSchema.from_orm(appointment).dict()), APPOINTMENT_CACHE_CONTROL,
+        last_modified=appointment.updated_at,
+    )
 
 
 @router.put("/{appointment_id}", response_model=AppointmentSchema)
@@ -138,7 +298,8 @@ def update_appointment(
     db: Session = Depends(deps.get_db),
     appointment_id: int,
     appointment_in: AppointmentUpdate,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Update an appointment.
@@ -148,38 +309,15 @@ def update_appointment(
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == appointment.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    if scope.is_restricted:
+        scope.check(appointment.hospital_id)
     elif current_user.role == "doctor":
-        if not current_user.doctor_profile or current_user.doctor_profile.id != appointment.doctor_id:
+        if not current_user.doctor_id or current_user.doctor_id != appointment.doctor_id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
     elif current_user.role == "patient":
-        if not current_user.patient_profile or current_user.patient_profile.id != appointment.patient_id:
+        if not current_user.patient_id or current_user.patient_id != appointment.patient_id:
             raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    # Check for double booking if changing date/time
-    if appointment_in.appointment_date or appointment_in.appointment_time:
-        new_date = appointment_in.appointment_date or appointment.appointment_date
-        new_time = appointment_in.appointment_time or appointment.appointment_time
-        
-        existing_appointment = db.query(Appointment).filter(
-            and_(
-                Appointment.doctor_id == appointment.doctor_id,
-                Appointment.appointment_date == new_date,
-                Appointment.appointment_time == new_time,
-                Appointment.status.in_(["scheduled", "confirmed"]),
-                Appointment.id != appointment_id
-            )
-        ).first()
-        
-        if existing_appointment:
-            raise HTTPException(
-                status_code=400,
-                detail="Doctor already has an appointment at this time"
-            )
-    
     # Handle cancellation
     if appointment_in.status == "cancelled" and appointment.status != "cancelled":
         appointment_in.cancelled_by = str(current_user.id)
@@ -190,6 +328,17 @@ def update_appointment(
         setattr(appointment, field, value)
     
     appointment.updated_by = str(current_user.id)
+    
+    # Re-reserve the slot if the appointment moves or becomes active again
+    if SLOT_FIELDS.intersection(update_data):
+        try:
+            return reserve_slot(db, appointment)
+        except SlotUnavailableError:
+            raise HTTPException(
+                status_code=409,
+                detail="Doctor already has an appointment at this time"
+            )
+    
     db.add(appointment)
     db.commit()
     db.refresh(appointment)
@@ -201,7 +350,8 @@ def delete_appointment(
     *,
     db: Session = Depends(deps.get_db),
     appointment_id: int,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Delete an appointment.
@@ -211,10 +361,7 @@ def delete_appointment(
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == appointment.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(appointment.hospital_id)
     
     db.delete(appointment)
     db.commit()
@@ -1,44 +1,98 @@
-from datetime import timedelta
 from typing import Any
 
 from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.core.config import settings
-from app.core.security import create_access_token, get_password_hash, verify_password
+from app.core.security import password_hasher
 from app.models.user import User
-from app.schemas.token import Token
+from app.schemas.token import Token, TokenRefresh
 from app.schemas.user import UserCreate, User as UserSchema
+from app.services.auth_tokens import InvalidRefreshToken, issue_tokens, revoke_refresh_token, rotate_refresh_token
+from app.services.principal import Principal, query_principal_users
+from app.services.token_revocation import token_revocations
 
 router = APIRouter()
 
 
 @router.post("/login", response_model=Token)
-def login_access_token(
+async def login_access_token(
     db: Session = Depends(deps.get_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    # Queries run in the threadpool, bcrypt on the password hasher's own pool; no
+    # connection is held while a login waits for bcrypt
+    user = await deps.read_and_release(
+        db, query_principal_users(db).filter(User.email == form_data.username).first
+    )
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return {
-        "access_token": create_access_token(
-            user.id, user.role, expires_delta=access_token_expires
-        ),
-        "token_type": "bearer",
-    }
+    def save() -> dict:
+        if new_hash:
+            # Stored with an outdated BCRYPT_ROUNDS; upgrade while we have the password
+            user.password_hash = new_hash
+            db.add(user)
+        return issue_tokens(db, user)
+    
+    return await run_in_threadpool(save)
+
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(
+    *,
+    db: Session = Depends(deps.get_db),
+    token_in: TokenRefresh,
+) -> Any:
+    """
+    Exchange a refresh token for a new access token and refresh token. Each
+    refresh token can be used once.
+    """
+    try:
+        return rotate_refresh_token(db, token_in.refresh_token)
+    except InvalidRefreshToken:
+        raise HTTPException(status_code=400, detail="Invalid refresh token")
+
+
+@router.post("/logout")
+def logout(
+    *,
+    db: Session = Depends(deps.get_db),
+    token_in: TokenRefresh,
+) -> Any:
+    """
+    Revoke a refresh token and the user's current access tokens.
+    """
+    try:
+        revoke_refresh_token(db, token_in.refresh_token)
+    except InvalidRefreshToken:
+        raise HTTPException(status_code=400, detail="Invalid refresh token")
+    return {"status": "success"}
+
+
+@router.post("/logout-all")
+def logout_all(
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Revoke every access and refresh token of the current user.
+    """
+    token_revocations.revoke(db, current_user.id, refresh_tokens=True)
+    return {"status": "success"}
 
 
 @router.post("/register", response_model=UserSchema)
-def register_user(
+async def register_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: UserCreate,
@@ -46,7 +100,7 @@ def register_user(
     """
     Register a new user.
     """
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = await deps.read_and_release(db, db.query(User).filter(User.email == user_in.email).first)
     if user:
         raise HTTPException(
             status_code=400,
@@ -56,24 +110,29 @@ def register_user(
     # Create new user
     db_user = User(
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await password_hasher.hash(user_in.password),
         full_name=user_in.full_name,
         phone=user_in.phone,
         role=user_in.role,
         is_active=user_in.is_active,
         profile_picture=user_in.profile_picture,
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    
+    def save() -> None:
+        db.add(db_user)
+        db.commit()
+        db.refresh(db_user)
+    
+    await run_in_threadpool(save)
     return db_user
 
 
 @router.get("/me", response_model=UserSchema)
 def read_users_me(
-    current_user: User = Depends(deps.get_current_active_user),
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get current user.
     """
-    return current_user
\ No newline at end of file
+    return db.query(User).filter(User.id == current_user.id).first()
\ No newline at end of file
@@ -1,41 +1,62 @@
-from typing import Any, List
+from typing import Any, List, Optional
+from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.pagination import paginate_list
+from app.api.responses import (
+    CATALOGUE_CACHE_CONTROL, FastJSONResponse, conditional_response, page_response, parse_fields
+)
+from app.api.tenant import TenantScope
 from app.models.department import Department
+from app.models.doctor import Doctor
 from app.models.hospital import Hospital
-from app.models.user import User
 from app.schemas.department import Department as DepartmentSchema, DepartmentCreate, DepartmentUpdate
+from app.schemas.availability import DoctorSlots, TimeSlot
+from app.services.availability import MAX_SLOT_RANGE_DAYS, get_free_slots
+from app.services.catalogue_cache import catalogue_cache
+from app.services.principal import Principal
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[DepartmentSchema])
 def read_departments(
+    request: Request,
     db: Session = Depends(deps.get_db),
     hospital_id: int = None,
     skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_user),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_total: bool = Query(False, description="Send the number of matching rows in X-Total-Count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included); default all"),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Retrieve departments.
     """
-    query = db.query(Department)
-    
+    # Served from the catalogue cache; the database is only read on a miss
     if hospital_id:
-        query = query.filter(Department.hospital_id == hospital_id)
+        snapshot = catalogue_cache.get(db, hospital_id)
+        snapshots = [snapshot] if snapshot else []
+    else:
+        snapshots = catalogue_cache.get_all(db)
     
     # Filter by permissions
-    if current_user.role == "hospital_admin":
-        hospitals = db.query(Hospital).filter(Hospital.admin_id == current_user.id).all()
-        hospital_ids = [h.id for h in hospitals]
-        query = query.filter(Department.hospital_id.in_(hospital_ids))
+    snapshots = scope.filter_snapshots(snapshots)
     
-    departments = query.offset(skip).limit(limit).all()
-    return departments
+    departments = sorted(
+        (department for snapshot in snapshots for department in snapshot.departments),
+        key=lambda department: department["id"],
+    )
+    page = paginate_list(departments, cursor, limit, skip, include_total)
+    # Snapshot dicts were validated when cached
+    return conditional_response(
+        request, page_response(page.items, page, parse_fields(fields, DepartmentSchema)), CATALOGUE_CACHE_CONTROL
+    )
 
 
 @router.post("/", response_model=DepartmentSchema)
@@ -43,7 +64,8 @@ def create_department(
     *,
     db: Session = Depends(deps.get_db),
     department_in: DepartmentCreate,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Create new department.
@@ -53,8 +75,7 @@ def create_department(
     if not hospital:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
-    if current_user.role == "hospital_admin" and hospital.admin_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(hospital.id)
     
     department = Department(
         **department_in.dict(),
@@ -63,15 +84,18 @@ def create_department(
     db.add(department)
     db.commit()
     db.refresh(department)
+    catalogue_cache.invalidate_hospital(department.hospital_id)
     return department
 
 
 @router.get("/{department_id}", response_model=DepartmentSchema)
 def read_department(
     *,
+    request: Request,
     db: Session = Depends(deps.get_db),
     department_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Get department by ID.
@@ -81,12 +105,55 @@ def read_department(
         raise HTTPException(status_code=404, detail="Department not found")
     
     # Check permissions for hospital admins
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == department.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(department.hospital_id)
     
-    return department
+    return conditional_response(
+        request, FastJSONResponse(DepartmentSchema.from_orm(department).dict()), CATALOGUE_CACHE_CONTROL,
+        last_modified=department.updated_at,
+    )
+
+
+@router.get("/{department_id}/slots", response_model=List[DoctorSlots])
+def read_department_slots(
+    *,
+    db: Session = Depends(deps.get_db),
+    department_id: int,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
+) -> Any:
+    """
+    Get free appointment slots for every active doctor in a department.
+    """
+    from_date = from_date or date.today()
+    to_date = to_date or from_date
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (to_date - from_date).days >= MAX_SLOT_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range cannot exceed {MAX_SLOT_RANGE_DAYS} days")
+    
+    department = db.query(Department).filter(Department.id == department_id).first()
+    if not department:
+        raise HTTPException(status_code=404, detail="Department not found")
+    
+    # Check permissions for hospital admins
+    scope.check(department.hospital_id)
+    
+    doctors = db.query(Doctor).filter(
+        Doctor.department_id == department_id,
+        Doctor.is_active == True
+    ).order_by(Doctor.id).all()
+    
+    free_slots = get_free_slots(db, doctors, from_date, to_date, not_before=datetime.now())
+    return [
+        DoctorSlots(
+            doctor_id=doctor.id,
+            full_name=doctor.full_name,
+            slots=[TimeSlot(start=start, end=end) for start, end in free_slots[doctor.id]],
+        )
+        for doctor in doctors
+    ]
 
 
 @router.put("/{department_id}", response_model=DepartmentSchema)
@@ -95,7 +162,8 @@ def update_department(
     db: Session = Depends(deps.get_db),
     department_id: int,
     department_in: DepartmentUpdate,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Update a department.
@@ -105,11 +173,9 @@ def update_department(
         raise HTTPException(status_code=404, detail="Department not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == department.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(department.hospital_id)
     
+    previous_hospital_id = department.hospital_id
     update_data = department_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(department, field, value)
@@ -118,6 +184,9 @@ def update_department(
     db.add(department)
     db.commit()
     db.refresh(department)
+    catalogue_cache.invalidate_hospital(previous_hospital_id)
+    if department.hospital_id != previous_hospital_id:
+        catalogue_cache.invalidate_hospital(department.hospital_id)
     return department
 
 
@@ -126,7 +195,8 @@ def delete_department(
     *,
     db: Session = Depends(deps.get_db),
     department_id: int,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Delete a department.
@@ -136,11 +206,9 @@ def delete_department(
         raise HTTPException(status_code=404, detail="Department not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == department.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(department.hospital_id)
     
     db.delete(department)
     db.commit()
+    catalogue_cache.invalidate_hospital(department.hospital_id)
     return {"status": "success"}
\ No newline at end of file
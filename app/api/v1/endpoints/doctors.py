@@ -1,45 +1,69 @@
-from typing import Any, List
+from typing import Any, List, Optional
+from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.pagination import paginate_list
+from app.api.responses import (
+    CATALOGUE_CACHE_CONTROL, FastJSONResponse, conditional_response, page_response, parse_fields
+)
+from app.api.tenant import TenantScope
+from app.models.department import Department
 from app.models.doctor import Doctor
 from app.models.hospital import Hospital
 from app.models.user import User
 from app.schemas.doctor import Doctor as DoctorSchema, DoctorCreate, DoctorUpdate
+from app.schemas.availability import TimeSlot
+from app.schemas.bulk_import import BulkImportResult
+from app.services.availability import MAX_SLOT_RANGE_DAYS, get_free_slots
+from app.services.bulk_import import BulkImporter, existing_ids, iter_chunks, iter_records
+from app.services.catalogue_cache import catalogue_cache
+from app.services.principal import Principal
+from app.services.token_revocation import token_revocations
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[DoctorSchema])
 def read_doctors(
+    request: Request,
     db: Session = Depends(deps.get_db),
     hospital_id: int = None,
     department_id: int = None,
     skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_user),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_total: bool = Query(False, description="Send the number of matching rows in X-Total-Count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included); default all"),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Retrieve doctors.
     """
-    query = db.query(Doctor)
-    
+    # Served from the catalogue cache; the database is only read on a miss
     if hospital_id:
-        query = query.filter(Doctor.hospital_id == hospital_id)
-    
-    if department_id:
-        query = query.filter(Doctor.department_id == department_id)
+        snapshot = catalogue_cache.get(db, hospital_id)
+        snapshots = [snapshot] if snapshot else []
+    else:
+        snapshots = catalogue_cache.get_all(db)
     
     # Filter by permissions
-    if current_user.role == "hospital_admin":
-        hospitals = db.query(Hospital).filter(Hospital.admin_id == current_user.id).all()
-        hospital_ids = [h.id for h in hospitals]
-        query = query.filter(Doctor.hospital_id.in_(hospital_ids))
+    snapshots = scope.filter_snapshots(snapshots)
     
-    doctors = query.offset(skip).limit(limit).all()
-    return doctors
+    doctors = sorted(
+        (doctor for snapshot in snapshots for doctor in snapshot.doctors
+         if not department_id or doctor["department_id"] == department_id),
+        key=lambda doctor: doctor["id"],
+    )
+    page = paginate_list(doctors, cursor, limit, skip, include_total)
+    # Snapshot dicts were validated when cached
+    return conditional_response(
+        request, page_response(page.items, page, parse_fields(fields, DoctorSchema)), CATALOGUE_CACHE_CONTROL
+    )
 
 
 @router.post("/", response_model=DoctorSchema)
@@ -47,7 +71,8 @@ def create_doctor(
     *,
     db: Session = Depends(deps.get_db),
     doctor_in: DoctorCreate,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Create new doctor.
@@ -57,8 +82,7 @@ def create_doctor(
     if not hospital:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
-    if current_user.role == "hospital_admin" and hospital.admin_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(hospital.id)
     
     doctor = Doctor(
         **doctor_in.dict(),
@@ -67,15 +91,65 @@ def create_doctor(
     db.add(doctor)
     db.commit()
     db.refresh(doctor)
+    catalogue_cache.invalidate_hospital(doctor.hospital_id)
+    token_revocations.revoke(db, doctor.user_id)
     return doctor
 
 
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_create_doctors(
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
+) -> Any:
+    """
+    Create many doctors from a JSON array or a CSV upload; invalid rows are reported and skipped.
+    """
+    def check(db: Session, doctors: List[DoctorCreate]) -> List[Optional[str]]:
+        hospital_ids = existing_ids(db, Hospital.id, (d.hospital_id for d in doctors))
+        departments = dict(db.query(Department.id, Department.hospital_id).filter(
+            Department.id.in_({d.department_id for d in doctors})
+        ))
+        user_ids = existing_ids(db, User.id, (d.user_id for d in doctors))
+        problems = []
+        for doctor in doctors:
+            if doctor.hospital_id not in hospital_ids:
+                problems.append("Hospital not found")
+            elif not scope.allows(doctor.hospital_id):
+                problems.append("Not enough permissions")
+            elif departments.get(doctor.department_id) != doctor.hospital_id:
+                problems.append("Department not found in this hospital")
+            elif doctor.user_id is not None and doctor.user_id not in user_ids:
+                problems.append("User not found")
+            else:
+                problems.append(None)
+        return problems
+    
+    def inserted(rows: List[dict]) -> None:
+        for hospital_id in {row["hospital_id"] for row in rows}:
+            catalogue_cache.invalidate_hospital(hospital_id)
+        token_revocations.revoke(db, *{row["user_id"] for row in rows})
+    
+    importer = BulkImporter(
+        db, Doctor, DoctorCreate,
+        prepare=lambda doctor: {**doctor.dict(), "created_by": str(current_user.id)},
+        check=check,
+        on_insert=inserted,
+    )
+    async for chunk in iter_chunks(iter_records(request)):
+        await run_in_threadpool(importer.import_chunk, chunk)
+    return importer.result()
+
+
 @router.get("/{doctor_id}", response_model=DoctorSchema)
 def read_doctor(
     *,
+    request: Request,
     db: Session = Depends(deps.get_db),
     doctor_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Get doctor by ID.
@@ -85,12 +159,46 @@ def read_doctor(
         raise HTTPException(status_code=404, detail="Doctor not found")
     
     # Check permissions for hospital admins
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == doctor.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(doctor.hospital_id)
     
-    return doctor
+    return conditional_response(
+        request, FastJSONResponse(DoctorSchema.from_orm(doctor).dict()), CATALOGUE_CACHE_CONTROL,
+        last_modified=doctor.updated_at,
+    )
+
+
+@router.get("/{doctor_id}/slots", response_model=List[TimeSlot])
+def read_doctor_slots(
+    *,
+    db: Session = Depends(deps.get_db),
+    doctor_id: int,
+    from_date: Optional[date] = Query(None, alias="from"),
+    to_date: Optional[date] = Query(None, alias="to"),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
+) -> Any:
+    """
+    Get free appointment slots for a doctor between two dates (inclusive).
+    """
+    from_date = from_date or date.today()
+    to_date = to_date or from_date
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (to_date - from_date).days >= MAX_SLOT_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range cannot exceed {MAX_SLOT_RANGE_DAYS} days")
+    
+    doctor = db.query(Doctor).filter(Doctor.id == doctor_id).first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    
+    # Check permissions for hospital admins
+    scope.check(doctor.hospital_id)
+    
+    if not doctor.is_active:
+        return []
+    
+    free_slots = get_free_slots(db, [doctor], from_date, to_date, not_before=datetime.now())
+    return [TimeSlot(start=start, end=end) for start, end in free_slots[doctor.id]]
 
 
 @router.put("/{doctor_id}", response_model=DoctorSchema)
@@ -99,7 +207,8 @@ def update_doctor(
     db: Session = Depends(deps.get_db),
     doctor_id: int,
     doctor_in: DoctorUpdate,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Update a doctor.
@@ -109,11 +218,10 @@ def update_doctor(
         raise HTTPException(status_code=404, detail="Doctor not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == doctor.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(doctor.hospital_id)
     
+    previous_hospital_id = doctor.hospital_id
+    previous_user_id = doctor.user_id
     update_data = doctor_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(doctor, field, value)
@@ -122,6 +230,12 @@ def update_doctor(
     db.add(doctor)
     db.commit()
     db.refresh(doctor)
+    catalogue_cache.invalidate_hospital(previous_hospital_id)
+    if doctor.hospital_id != previous_hospital_id:
+        catalogue_cache.invalidate_hospital(doctor.hospital_id)
+    # Only the linked accounts' claims change; other edits keep their tokens valid
+    if doctor.user_id != previous_user_id:
+        token_revocations.revoke(db, previous_user_id, doctor.user_id)
     return doctor
 
 
@@ -130,7 +244,8 @@ def delete_doctor(
     *,
     db: Session = Depends(deps.get_db),
     doctor_id: int,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Delete a doctor.
@@ -140,11 +255,11 @@ def delete_doctor(
         raise HTTPException(status_code=404, detail="Doctor not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin":
-        hospital = db.query(Hospital).filter(Hospital.id == doctor.hospital_id).first()
-        if hospital.admin_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(doctor.hospital_id)
     
+    hospital_id, user_id = doctor.hospital_id, doctor.user_id
     db.delete(doctor)
     db.commit()
+    catalogue_cache.invalidate_hospital(hospital_id)
+    token_revocations.revoke(db, user_id)
     return {"status": "success"}
\ No newline at end of file
@@ -1,25 +1,80 @@
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.pagination import paginate_list
+from app.api.responses import (
+    CATALOGUE_CACHE_CONTROL, FastJSONResponse, conditional_response, page_response, parse_fields, project
+)
+from app.api.tenant import TenantScope
 from app.models.hospital import Hospital
 from app.models.department import Department
 from app.models.doctor import Doctor
 from app.models.user import User
+from app.schemas.department_summary import DepartmentSummary
+from app.schemas.doctor_summary import DoctorSummary
 from app.schemas.hospital import Hospital as HospitalSchema, HospitalCreate, HospitalUpdate, HospitalDetail
+from app.services.catalogue_cache import HospitalSnapshot, catalogue_cache
+from app.services.principal import Principal
+from app.services.token_revocation import token_revocations
 
 router = APIRouter()
 
 
+def snapshot_to_dict(
+    snapshot: HospitalSnapshot, include_departments: bool, include_doctors: bool
+) -> Dict[str, Any]:
+    """
+    ``Hospital`` or ``HospitalDetail`` as a plain dict built from a cached
+    snapshot (validated when it was cached), keeping only active departments
+    and doctors
+    """
+    if not (include_departments or include_doctors):
+        return snapshot.hospital
+    return {
+        **snapshot.hospital,
+        "departments": [
+            project(d, DepartmentSummary.__fields__) for d in snapshot.departments if d["is_active"]
+        ] if include_departments else None,
+        "doctors": [
+            project(d, DoctorSummary.__fields__) for d in snapshot.doctors if d["is_active"]
+        ] if include_doctors else None,
+    }
+
+
+def snapshot_response(
+    request: Request, snapshot: HospitalSnapshot, include_departments: bool, include_doctors: bool
+) -> Response:
+    content = snapshot_to_dict(snapshot, include_departments, include_doctors)
+    # updated_at only covers the hospital row, not its departments and doctors
+    last_modified = None if include_departments or include_doctors else snapshot.hospital["updated_at"]
+    return conditional_response(
+        request, FastJSONResponse(content), CATALOGUE_CACHE_CONTROL, last_modified=last_modified
+    )
+
+
+def check_hospital_access(snapshot: HospitalSnapshot, current_user: Principal, scope: TenantScope) -> None:
+    if current_user.role not in ["super_admin", "hospital_admin"]:
+        if snapshot.hospital["status"] != "active":
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+    else:
+        scope.check(snapshot.hospital["id"])
+
+
 @router.get("/", response_model=List[Union[HospitalSchema, HospitalDetail]])
 def read_hospitals(
+    request: Request,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_total: bool = Query(False, description="Send the number of matching rows in X-Total-Count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included); default all"),
     include: Optional[str] = Query(None, description="Comma-separated list of related entities to include (departments,doctors)"),
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Retrieve hospitals.
@@ -29,52 +84,34 @@ def read_hospitals(
     include_departments = "departments" in include_params
     include_doctors = "doctors" in include_params
     
-    # Base query
-    query = db.query(Hospital)
-    
-    # Add eager loading if needed
-    if include_departments:
-        query = query.options(joinedload(Hospital.departments))
-    if include_doctors:
-        query = query.options(joinedload(Hospital.doctors))
+    # Served from the catalogue cache; the database is only read on a miss
+    snapshots = catalogue_cache.get_all(db)
     
     # Apply permission filters
-    if current_user.role == "super_admin":
-        hospitals = query.offset(skip).limit(limit).all()
-    elif current_user.role == "hospital_admin":
-        hospitals = query.filter(Hospital.admin_id == current_user.id).offset(skip).limit(limit).all()
-    else:
-        hospitals = query.filter(Hospital.status == "active").offset(skip).limit(limit).all()
-    
-    # Process hospitals based on includes
-    result = []
-    for hospital in hospitals:
-        # Filter active departments and doctors if included
-        if include_departments and hasattr(hospital, "departments"):
-            active_departments = [dept for dept in hospital.departments if dept.is_active]
-            # We need to set this for the Pydantic model to pick it up
-            hospital.departments = active_departments
-            
-        if include_doctors and hasattr(hospital, "doctors"):
-            active_doctors = [doc for doc in hospital.doctors if doc.is_active]
-            hospital.doctors = active_doctors
-        
-        # Convert to appropriate Pydantic model
-        if include_departments or include_doctors:
-            result.append(HospitalDetail.from_orm(hospital))
-        else:
-            result.append(HospitalSchema.from_orm(hospital))
-    
-    return result
+    if scope.is_restricted:
+        snapshots = scope.filter_snapshots(snapshots)
+    elif current_user.role != "super_admin":
+        snapshots = [s for s in snapshots if s.hospital["status"] == "active"]
+    
+    names = parse_fields(fields, HospitalSchema)
+    if names and (include_departments or include_doctors):
+        names += ["departments", "doctors"]
+    page = paginate_list(snapshots, cursor, limit, skip, include_total, key=lambda s: s.hospital["id"])
+    response = page_response(
+        [snapshot_to_dict(snapshot, include_departments, include_doctors) for snapshot in page.items], page, names
+    )
+    return conditional_response(request, response, CATALOGUE_CACHE_CONTROL)
 
 
 @router.get("/{hospital_id}", response_model=Union[HospitalSchema, HospitalDetail])
 def read_hospital(
     *,
+    request: Request,
     db: Session = Depends(deps.get_db),
     hospital_id: int,
     include: Optional[str] = Query(None, description="Comma-separated list of related entities to include (departments,doctors)"),
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Get hospital by ID.
@@ -84,73 +121,32 @@ def read_hospital(
     include_departments = "departments" in include_params
     include_doctors = "doctors" in include_params
     
-    # Base query
-    query = db.query(Hospital)
-    
-    # Add eager loading if needed
-    if include_departments:
-        query = query.options(joinedload(Hospital.departments))
-    if include_doctors:
-        query = query.options(joinedload(Hospital.doctors))
-    
-    hospital = query.filter(Hospital.id == hospital_id).first()
-    if not hospital:
+    snapshot = catalogue_cache.get(db, hospital_id)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
-    # Check permissions
-    if current_user.role not in ["super_admin", "hospital_admin"]:
-        if hospital.status != "active":
-            raise HTTPException(status_code=403, detail="Not enough permissions")
-    elif current_user.role == "hospital_admin" and hospital.admin_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Filter active departments and doctors if included
-    if include_departments and hasattr(hospital, "departments"):
-        hospital.departments = [dept for dept in hospital.departments if dept.is_active]
-    if include_doctors and hasattr(hospital, "doctors"):
-        hospital.doctors = [doc for doc in hospital.doctors if doc.is_active]
-    
-    # Convert to appropriate Pydantic model
-    if include_departments or include_doctors:
-        return HospitalDetail.from_orm(hospital)
-    else:
-        return HospitalSchema.from_orm(hospital)
+    check_hospital_access(snapshot, current_user, scope)
+    return snapshot_response(request, snapshot, include_departments, include_doctors)
 
 
 @router.get("/{hospital_id}/full", response_model=HospitalDetail)
 def read_hospital_full(
     *,
+    request: Request,
     db: Session = Depends(deps.get_db),
     hospital_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Get hospital by ID with all related data (departments and doctors).
     """
-    # Query with eager loading
-    query = db.query(Hospital)
-    query = query.options(
-        joinedload(Hospital.departments),
-        joinedload(Hospital.doctors)
-    )
-    
-    hospital = query.filter(Hospital.id == hospital_id).first()
-    if not hospital:
+    snapshot = catalogue_cache.get(db, hospital_id)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
-    # Check permissions
-    if current_user.role not in ["super_admin", "hospital_admin"]:
-        if hospital.status != "active":
-            raise HTTPException(status_code=403, detail="Not enough permissions")
-    elif current_user.role == "hospital_admin" and hospital.admin_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Filter active departments and doctors
-    hospital.departments = [dept for dept in hospital.departments if dept.is_active]
-    hospital.doctors = [doc for doc in hospital.doctors if doc.is_active]
-    
-    # Convert to Pydantic model
-    return HospitalDetail.from_orm(hospital)
+    check_hospital_access(snapshot, current_user, scope)
+    return snapshot_response(request, snapshot, include_departments=True, include_doctors=True)
 
 
 @router.post("/", response_model=HospitalSchema)
@@ -158,7 +154,7 @@ def create_hospital(
     *,
     db: Session = Depends(deps.get_db),
     hospital_in: HospitalCreate,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
 ) -> Any:
     """
     Create new hospital.
@@ -187,13 +183,15 @@ def create_hospital(
         db.add(hospital)
         db.commit()
         db.refresh(hospital)
+        catalogue_cache.invalidate_all()
+        token_revocations.revoke(db, hospital.admin_id)
         
         # Convert to Pydantic model
         return HospitalSchema.from_orm(hospital)
     except Exception as e:
         db.rollback()
         from app.core.logging import logger
-        logger.error(f"Error creating hospital: {str(e)}")
+        logger.error("Error creating hospital: %s", e)
         raise
 
 
@@ -203,7 +201,8 @@ def update_hospital(
     db: Session = Depends(deps.get_db),
     hospital_id: int,
     hospital_in: HospitalUpdate,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+    scope: TenantScope = Depends(deps.get_tenant_scope),
 ) -> Any:
     """
     Update a hospital.
@@ -213,9 +212,9 @@ def update_hospital(
         raise HTTPException(status_code=404, detail="Hospital not found")
     
     # Check permissions
-    if current_user.role == "hospital_admin" and hospital.admin_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    scope.check(hospital.id)
     
+    previous_admin_id = hospital.admin_id
     update_data = hospital_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(hospital, field, value)
@@ -224,6 +223,10 @@ def update_hospital(
     db.add(hospital)
     db.commit()
     db.refresh(hospital)
+    catalogue_cache.invalidate_hospital(hospital.id)
+    # Only the admins' claims change; other edits keep their tokens valid
+    if hospital.admin_id != previous_admin_id:
+        token_revocations.revoke(db, previous_admin_id, hospital.admin_id)
     
     # Convert to Pydantic model
     return HospitalSchema.from_orm(hospital)
@@ -234,7 +237,7 @@ def delete_hospital(
     *,
     db: Session = Depends(deps.get_db),
     hospital_id: int,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Delete a hospital.
@@ -243,6 +246,9 @@ def delete_hospital(
     if not hospital:
         raise HTTPException(status_code=404, detail="Hospital not found")
     
+    admin_id = hospital.admin_id
     db.delete(hospital)
     db.commit()
+    catalogue_cache.invalidate_all()
+    token_revocations.revoke(db, admin_id)
     return {"status": "success"}
\ No newline at end of file
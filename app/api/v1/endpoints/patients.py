@@ -1,12 +1,19 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.pagination import paginate_query
+from app.api.responses import page_response, parse_fields, schema_columns
 from app.models.patient import Patient
 from app.models.user import User
+from app.schemas.bulk_import import BulkImportResult
 from app.schemas.patient import Patient as PatientSchema, PatientCreate, PatientUpdate
+from app.services.bulk_import import BulkImporter, existing_ids, iter_chunks, iter_records
+from app.services.principal import Principal
+from app.services.token_revocation import token_revocations
 
 router = APIRouter()
 
@@ -15,14 +22,19 @@ router = APIRouter()
 def read_patients(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_total: bool = Query(False, description="Send the number of matching rows in X-Total-Count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included); default all"),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
 ) -> Any:
     """
     Retrieve patients.
     """
-    patients = db.query(Patient).offset(skip).limit(limit).all()
-    return patients
+    names = parse_fields(fields, PatientSchema)
+    query = db.query(*schema_columns(Patient, PatientSchema, names))
+    page = paginate_query(query, [(Patient.id, int)], cursor, limit, skip, include_total)
+    return page_response(page.items, page)
 
 
 @router.post("/", response_model=PatientSchema)
@@ -30,7 +42,7 @@ def create_patient(
     *,
     db: Session = Depends(deps.get_db),
     patient_in: PatientCreate,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Create new patient.
@@ -42,15 +54,43 @@ def create_patient(
     db.add(patient)
     db.commit()
     db.refresh(patient)
+    token_revocations.revoke(db, patient.user_id)
     return patient
 
 
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_create_patients(
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
+) -> Any:
+    """
+    Create many patients from a JSON array or a CSV upload; invalid rows are reported and skipped.
+    """
+    def check(db: Session, patients: List[PatientCreate]) -> List[Optional[str]]:
+        user_ids = existing_ids(db, User.id, (p.user_id for p in patients))
+        return [
+            "User not found" if p.user_id is not None and p.user_id not in user_ids else None
+            for p in patients
+        ]
+    
+    importer = BulkImporter(
+        db, Patient, PatientCreate,
+        prepare=lambda patient: {**patient.dict(), "created_by": str(current_user.id)},
+        check=check,
+        on_insert=lambda rows: token_revocations.revoke(db, *{row["user_id"] for row in rows}),
+    )
+    async for chunk in iter_chunks(iter_records(request)):
+        await run_in_threadpool(importer.import_chunk, chunk)
+    return importer.result()
+
+
 @router.get("/{patient_id}", response_model=PatientSchema)
 def read_patient(
     *,
     db: Session = Depends(deps.get_db),
     patient_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Get patient by ID.
@@ -60,7 +100,7 @@ def read_patient(
         raise HTTPException(status_code=404, detail="Patient not found")
     
     # Patients can only access their own records
-    if current_user.role == "patient" and (not current_user.patient_profile or current_user.patient_profile.id != patient_id):
+    if current_user.role == "patient" and (not current_user.patient_id or current_user.patient_id != patient_id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
     return patient
@@ -72,7 +112,7 @@ def update_patient(
     db: Session = Depends(deps.get_db),
     patient_id: int,
     patient_in: PatientUpdate,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
 ) -> Any:
     """
     Update a patient.
@@ -82,9 +122,10 @@ def update_patient(
         raise HTTPException(status_code=404, detail="Patient not found")
     
     # Patients can only update their own records
-    if current_user.role == "patient" and (not current_user.patient_profile or current_user.patient_profile.id != patient_id):
+    if current_user.role == "patient" and (not current_user.patient_id or current_user.patient_id != patient_id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    previous_user_id = patient.user_id
     update_data = patient_in.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(patient, field, value)
@@ -93,6 +134,9 @@ def update_patient(
     db.add(patient)
     db.commit()
     db.refresh(patient)
+    # Only the linked accounts' claims change; other edits keep their tokens valid
+    if patient.user_id != previous_user_id:
+        token_revocations.revoke(db, previous_user_id, patient.user_id)
     return patient
 
 
@@ -101,7 +145,7 @@ def delete_patient(
     *,
     db: Session = Depends(deps.get_db),
     patient_id: int,
-    current_user: User = Depends(deps.get_current_hospital_admin),
+    current_user: Principal = Depends(deps.get_current_hospital_admin),
 ) -> Any:
     """
     Delete a patient.
@@ -110,6 +154,8 @@ def delete_patient(
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
+    user_id = patient.user_id
     db.delete(patient)
     db.commit()
+    token_revocations.revoke(db, user_id)
     return {"status": "success"}
\ No newline at end of file
@@ -1,42 +1,56 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.core.security import get_password_hash
+from app.api.pagination import paginate_query
+from app.api.responses import page_response, parse_fields, schema_columns
+from app.core.security import password_hasher
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserCreate, UserUpdate
+from app.services.principal import Principal
+from app.services.token_revocation import token_revocations
 
 router = APIRouter()
 
+# User fields that access tokens depend on; changing one revokes the user's tokens
+AUTHORIZATION_FIELDS = {"role", "is_active", "password_hash"}
+
 
 @router.get("/", response_model=List[UserSchema])
 def read_users(
     db: Session = Depends(deps.get_db),
     skip: int = 0,
-    limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    include_total: bool = Query(False, description="Send the number of matching rows in X-Total-Count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included); default all"),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Retrieve users.
     """
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    names = parse_fields(fields, UserSchema)
+    query = db.query(*schema_columns(User, UserSchema, names))
+    page = paginate_query(query, [(User.id, int)], cursor, limit, skip, include_total)
+    return page_response(page.items, page)
 
 
 @router.post("/", response_model=UserSchema)
-def create_user(
+async def create_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: UserCreate,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Create new user.
     """
-    user = db.query(User).filter(User.email == user_in.email).first()
+    # Queries run in the threadpool, bcrypt on the password hasher's own pool
+    user = await deps.read_and_release(db, db.query(User).filter(User.email == user_in.email).first)
     if user:
         raise HTTPException(
             status_code=400,
@@ -45,7 +59,7 @@ def create_user(
     
     user = User(
         email=user_in.email,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await password_hasher.hash(user_in.password),
         full_name=user_in.full_name,
         phone=user_in.phone,
         role=user_in.role,
@@ -53,16 +67,20 @@ def create_user(
         profile_picture=user_in.profile_picture,
         created_by=str(current_user.id),
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    
+    def save() -> None:
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    
+    await run_in_threadpool(save)
     return user
 
 
 @router.get("/{user_id}", response_model=UserSchema)
 def read_user_by_id(
     user_id: int,
-    current_user: User = Depends(deps.get_current_active_user),
+    current_user: Principal = Depends(deps.get_current_active_user),
     db: Session = Depends(deps.get_db),
 ) -> Any:
     """
@@ -77,30 +95,41 @@ def read_user_by_id(
 
 
 @router.put("/{user_id}", response_model=UserSchema)
-def update_user(
+async def update_user(
     *,
     db: Session = Depends(deps.get_db),
     user_id: int,
     user_in: UserUpdate,
-    current_user: User = Depends(deps.get_current_active_superuser),
+    current_user: Principal = Depends(deps.get_current_active_superuser),
 ) -> Any:
     """
     Update a user.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    # Queries run in the threadpool, bcrypt on the password hasher's own pool
+    user = await deps.read_and_release(db, db.query(User).filter(User.id == user_id).first)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     update_data = user_in.dict(exclude_unset=True)
-    if "password" in update_data and update_data["password"]:
-        update_data["password_hash"] = get_password_hash(update_data["password"])
-        del update_data["password"]
+    # Not a column; an empty or null password leaves the current one
+    password = update_data.pop("password", None)
+    if password:
+        update_data["password_hash"] = await password_hasher.hash(password)
     
-    for field, value in update_data.items():
-        setattr(user, field, value)
+    def save() -> None:
+        db.add(user)
+        changed = {field for field, value in update_data.items() if getattr(user, field) != value}
+        for field, value in update_data.items():
+            setattr(user, field, value)
+        
+        user.updated_by = str(current_user.id)
+        db.commit()
+        # New claims via refresh; a new password or deactivation also ends existing sessions
+        if changed & AUTHORIZATION_FIELDS:
+            token_revocations.revoke(
+                db, user.id, refresh_tokens="password_hash" in changed or "is_active" in changed and not user.is_active
+            )
+        db.refresh(user)
     
-    user.updated_by = str(current_user.id)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    await run_in_threadpool(save)
     return user
\ No newline at end of file
@@ -1,10 +1,11 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, Depends, Request, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import deps
 from app.services.ai_voice import AIVoiceAssistant
+from app.services.call_session import call_session
 
 router = APIRouter()
 
@@ -12,7 +13,7 @@ router = APIRouter()
 @router.post("/incoming-call")
 async def incoming_call(
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Handle incoming Twilio voice calls
@@ -20,8 +21,9 @@ async def incoming_call(
     form_data = await request.form()
     phone_number = form_data.get("From", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.handle_incoming_call(phone_number)
+    async with call_session(form_data) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.handle_incoming_call(phone_number)
     
     return {"twiml": twiml_response}
 
@@ -29,7 +31,7 @@ async def incoming_call(
 @router.post("/collect-patient-info")
 async def collect_patient_info(
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Collect patient information from speech
@@ -38,8 +40,9 @@ async def collect_patient_info(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_patient_info(speech_result, phone_number)
+    async with call_session(form_data) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_patient_info(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -47,7 +50,7 @@ async def collect_patient_info(
 @router.post("/appointment-options")
 async def appointment_options(
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process appointment options
@@ -56,8 +59,9 @@ async def appointment_options(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_appointment_options(speech_result, phone_number)
+    async with call_session(form_data) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_appointment_options(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -65,7 +69,7 @@ async def appointment_options(
 @router.post("/select-hospital")
 async def select_hospital(
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process hospital selection
@@ -74,8 +78,9 @@ async def select_hospital(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_hospital_selection(speech_result, phone_number)
+    async with call_session(form_data) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_hospital_selection(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -83,8 +88,8 @@ async def select_hospital(
 @router.post("/select-department")
 async def select_department(
     request: Request,
-    hospital_id: int,
-    db: Session = Depends(deps.get_db),
+    hospital_id: Optional[int] = None,
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process department selection
@@ -93,8 +98,9 @@ async def select_department(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_department_selection(speech_result, phone_number, hospital_id)
+    async with call_session(form_data, hospital_id=hospital_id) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_department_selection(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -102,9 +108,9 @@ async def select_department(
 @router.post("/select-doctor")
 async def select_doctor(
     request: Request,
-    hospital_id: int,
-    department_id: int,
-    db: Session = Depends(deps.get_db),
+    hospital_id: Optional[int] = None,
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process doctor selection
@@ -113,8 +119,9 @@ async def select_doctor(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_doctor_selection(speech_result, phone_number, hospital_id, department_id)
+    async with call_session(form_data, hospital_id=hospital_id, department_id=department_id) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_doctor_selection(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -122,10 +129,10 @@ async def select_doctor(
 @router.post("/select-date")
 async def select_date(
     request: Request,
-    hospital_id: int,
-    department_id: int,
-    doctor_id: int,
-    db: Session = Depends(deps.get_db),
+    hospital_id: Optional[int] = None,
+    department_id: Optional[int] = None,
+    doctor_id: Optional[int] = None,
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process date selection
@@ -134,8 +141,9 @@ async def select_date(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_date_selection(speech_result, phone_number, hospital_id, department_id, doctor_id)
+    async with call_session(form_data, hospital_id=hospital_id, department_id=department_id, doctor_id=doctor_id) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_date_selection(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -143,11 +151,11 @@ async def select_date(
 @router.post("/select-time")
 async def select_time(
     request: Request,
-    hospital_id: int,
-    department_id: int,
-    doctor_id: int,
-    date: str,
-    db: Session = Depends(deps.get_db),
+    hospital_id: Optional[int] = None,
+    department_id: Optional[int] = None,
+    doctor_id: Optional[int] = None,
+    date: Optional[str] = None,
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process time selection
@@ -156,8 +164,9 @@ async def select_time(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_time_selection(speech_result, phone_number, hospital_id, department_id, doctor_id, date)
+    async with call_session(form_data, hospital_id=hospital_id, department_id=department_id, doctor_id=doctor_id, date=date) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_time_selection(speech_result, phone_number)
     
     return {"twiml": twiml_response}
 
@@ -165,7 +174,7 @@ async def select_time(
 @router.post("/cancel-appointment")
 async def cancel_appointment(
     request: Request,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
 ) -> Any:
     """
     Process appointment cancellation
@@ -174,7 +183,8 @@ async def cancel_appointment(
     phone_number = form_data.get("From", "")
     speech_result = form_data.get("SpeechResult", "") or form_data.get("Digits", "")
     
-    ai_voice = AIVoiceAssistant(db)
-    twiml_response = ai_voice.process_cancel_appointment(speech_result, phone_number)
+    async with call_session(form_data) as session:
+        ai_voice = AIVoiceAssistant(db, session)
+        twiml_response = await ai_voice.process_cancel_appointment(speech_result, phone_number)
     
     return {"twiml": twiml_response}
\ No newline at end of file
@@ -9,10 +9,47 @@ class Settings(BaseSettings):
     
     # Security
     SECRET_KEY: str = secrets.token_urlsafe(32)
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15  # also how long a revocation is remembered
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    TOKEN_REVOCATION_SYNC_SECONDS: int = 5  # how often workers poll for other workers' revocations
+    BCRYPT_ROUNDS: int = 12  # changing it re-hashes passwords on their next login
+    PASSWORD_HASH_WORKERS: Optional[int] = None  # bcrypt threads; defaults to the CPU count
+    PASSWORD_HASH_MAX_PENDING: int = 64  # queued + running hashes before logins get 503
     
     # Database
     DATABASE_URL: str = "sqlite:///./hospital_booking.db"
+    # Defaults to DATABASE_URL with the asyncpg / aiosqlite driver
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # PostgreSQL only, 0 disables
+    # Raise instead of lazy loading relationships that a query did not load
+    # explicitly (development and query-count checks; off in production)
+    SQL_RAISELOAD: bool = False
+    SLOW_QUERY_THRESHOLD_MS: int = 200  # log statements slower than this, 0 disables
+    
+    # SQLite tuning (ignored for other databases)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    
+    # Hospital/department/doctor catalogue cache (per process)
+    CATALOGUE_CACHE_TTL_SECONDS: int = 300  # 0 disables caching
+    # How long clients may reuse catalogue responses before revalidating (Cache-Control max-age)
+    CATALOGUE_HTTP_MAX_AGE_SECONDS: int = 60
+    
+    # Logging (see app.core.logging)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_FILE: str = "logs/app.log"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_QUEUE_SIZE: int = 10000  # records waiting to be written; more are dropped
+    LOG_ACCESS_SAMPLE_RATE: float = 1.0  # share of successful requests logged
     
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = ["*"]
@@ -20,6 +57,22 @@ class Settings(BaseSettings):
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
     
+    # LLM client used by the voice assistant
+    LLM_BACKEND: str = "openai"  # "openai" or "fake" (local, for tests)
+    LLM_MODEL: str = "text-davinci-003"
+    LLM_TIMEOUT_SECONDS: float = 4.0  # whole-call deadline incl. retries
+    LLM_MAX_CONCURRENCY: int = 16  # in-flight requests per worker
+    LLM_MAX_RETRIES: int = 1
+    LLM_HEDGE_DELAY_SECONDS: Optional[float] = None  # send a second request after this delay
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    
+    # Voice call sessions, keyed by Twilio CallSid
+    CALL_SESSION_BACKEND: str = "memory"  # "memory" (single worker) or "redis"
+    CALL_SESSION_TTL_SECONDS: int = 1800
+    CALL_SESSION_MAX_ENTRIES: int = 10000
+    REDIS_URL: Optional[str] = None  # unset with the redis backend uses a local stand-in
+    
     # Twilio
     TWILIO_ACCOUNT_SID: Optional[str] = None
     TWILIO_AUTH_TOKEN: Optional[str] = None
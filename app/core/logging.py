@@ -1,20 +1,147 @@
+"""Application logging.
+
+Loggers only put records on an in-memory queue (``QueueHandler``); a
+``QueueListener`` thread formats them and does the file and console I/O, so a
+request never waits on the disk. Message arguments are merged into the record
+when it is queued, but tracebacks are only formatted by the listener.
+
+* ``LOG_FORMAT=json`` (default) writes one JSON object per line with the
+  request ID and any ``extra`` fields; ``text`` keeps the classic format.
+* The file is rotated at ``LOG_MAX_BYTES`` keeping ``LOG_BACKUP_COUNT`` files.
+* The per-request access log is sampled with ``LOG_ACCESS_SAMPLE_RATE``;
+  warnings and errors are always kept.
+* If the queue is full (``LOG_QUEUE_SIZE``) records are dropped, never waited
+  for, and counted in ``log_records_dropped_total``.
+"""
+import atexit
+import json
 import logging
+import queue
+import random
 import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional
 
-# Create logs directory if it doesn't exist
-logs_dir = Path("logs")
-logs_dir.mkdir(exist_ok=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("logs/app.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
+from app.core.config import settings
+from app.core.metrics import registry
+
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_REQUEST_ID_LENGTH = 64
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+log_records_dropped = registry.counter(
+    "log_records_dropped_total", "Log records dropped because the logging queue was full"
 )
 
+
+def set_request_id(incoming: Optional[str] = None) -> str:
+    """Use the caller's request ID if it looks sane, otherwise generate one"""
+    if incoming and len(incoming) <= MAX_REQUEST_ID_LENGTH and incoming.replace("-", "").isalnum():
+        request_id = incoming
+    else:
+        request_id = uuid.uuid4().hex
+    _request_id.set(request_id)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request's ID (``-`` outside requests)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get() or "-"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps ``rate`` of the records below WARNING, and every record from WARNING up"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, leave exc_info for the listener to format
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+
+
+def setup_logging() -> QueueListener:
+    log_file = Path(settings.LOG_FILE)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+
+    formatter = _formatter()
+    handlers = [
+        RotatingFileHandler(log_file, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT),
+        logging.StreamHandler(sys.stdout),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+
+listener = setup_logging()
+
 # Create a logger
-logger = logging.getLogger("hospital_booking")
\ No newline at end of file
+logger = logging.getLogger("hospital_booking")
+
+# One line per request (see main.add_process_time_header), sampled
+access_logger = logging.getLogger("hospital_booking.access")
+access_logger.addFilter(SamplingFilter(settings.LOG_ACCESS_SAMPLE_RATE))
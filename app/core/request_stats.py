@@ -0,0 +1,66 @@
+"""Per-request timing of database and LLM work.
+
+The HTTP middleware starts a ``RequestStats`` for every request; the SQL event
+hooks (``app.db.instrumentation``) and the LLM client add to whichever one is
+current. The context variable follows the request into FastAPI's threadpool
+and SQLAlchemy's async greenlets, so both sync and async handlers are covered.
+Work done outside a request (scripts, background tasks) is not recorded.
+"""
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+
+class RequestStats:
+    """Time spent in the database and the LLM during one request"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+    
+    def add_query(self, seconds: float) -> None:
+        self.db_queries += 1
+        self.db_seconds += seconds
+    
+    def add_llm_call(self, seconds: float) -> None:
+        self.llm_calls += 1
+        self.llm_seconds += seconds
+    
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+    
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value: db, llm, the rest (app) and total, in ms"""
+        total = self.elapsed()
+        app = max(total - self.db_seconds - self.llm_seconds, 0.0)
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+            f'llm;dur={self.llm_seconds * 1000:.1f};desc="{self.llm_calls} calls"',
+            f"app;dur={app * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+    
+    def log_fields(self) -> Dict[str, Any]:
+        return {
+            "duration_ms": round(self.elapsed() * 1000, 1),
+            "db_queries": self.db_queries,
+            "db_ms": round(self.db_seconds * 1000, 1),
+            "llm_calls": self.llm_calls,
+            "llm_ms": round(self.llm_seconds * 1000, 1),
+        }
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def start_request_stats() -> RequestStats:
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current.get()
@@ -1,33 +1,125 @@
+import asyncio
+import hashlib
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Callable, Dict, Tuple, TypeVar, Union, Optional
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.metrics import registry
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are re-hashed on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_desired_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=settings.BCRYPT_ROUNDS,
+)
 
 ALGORITHM = "HS256"
 
 
 def create_access_token(
-    subject: Union[str, Any], role: str, expires_delta: Optional[timedelta] = None
+    subject: Union[str, Any],
+    role: str,
+    version: int = 0,
+    claims: Optional[Dict[str, Any]] = None,
+    expires_delta: Optional[timedelta] = None,
 ) -> str:
+    """
+    ``version`` is the user's token_version (see app.services.token_revocation)
+    and ``claims`` what authorization needs besides the role, so requests can
+    be authorized from the token alone.
+    """
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
-    to_encode = {"exp": expire, "sub": str(subject), "role": role}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject), "role": role, "ver": version}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_refresh_token() -> Tuple[str, str]:
+    """A new opaque refresh token and the hash to store for it"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are random, so a fast unsalted hash is enough
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+
+T = TypeVar("T")
+
+password_hash_pending = registry.gauge(
+    "password_hash_pending", "bcrypt operations queued or running"
+)
+password_hash_rejected = registry.counter(
+    "password_hash_rejected_total", "bcrypt operations refused because the queue was full"
+)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool (bcrypt releases the GIL)
+    so login bursts neither block the event loop nor take over FastAPI's
+    shared threadpool. Once ``max_pending`` operations are queued or running,
+    further ones fail fast with ``PasswordHasherBusy`` instead of queueing
+    behind a storm.
+    """
+    
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+    
+    async def _run(self, function: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                password_hash_rejected.inc()
+                raise PasswordHasherBusy()
+            self._pending += 1
+        password_hash_pending.inc()
+        try:
+            return await asyncio.wrap_future(self._executor.submit(function, *args))
+        finally:
+            with self._lock:
+                self._pending -= 1
+            password_hash_pending.dec()
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Whether the password matches, and a new hash if the stored one uses an outdated cost"""
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,59 @@
+import re
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import db_query_duration
+from app.core.request_stats import current_request_stats
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# Not asyncpg's $1 placeholders, which _PLACEHOLDER_LIST still has to match
+_NUMBER_LITERAL = re.compile(r"(?<!\$)\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+# asyncpg numbers placeholders, so their numbers shift with the IN lists before them
+_POSITIONAL_PLACEHOLDER = re.compile(r"\$\d+")
+MAX_LOGGED_SQL_LENGTH = 1000
+
+
+def normalize_sql(statement: str) -> str:
+    """Statement shape for logs: literals and expanded IN lists collapsed, no values"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    statement = _POSITIONAL_PLACEHOLDER.sub("$?", statement)
+    return statement[:MAX_LOGGED_SQL_LENGTH]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    db_query_duration.observe(elapsed)
+    stats = current_request_stats()
+    if stats is not None:
+        stats.add_query(elapsed)
+    if settings.SLOW_QUERY_THRESHOLD_MS and elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        sql = normalize_sql(statement)
+        logger.warning("Slow query (%.1fms): %s", elapsed * 1000, sql, extra={"db_ms": round(elapsed * 1000, 1), "sql": sql})
+
+
+def _handle_error(exception_context):
+    # The statement failed, so after_cursor_execute will not pop its start time
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement on ``engine`` for the current request and log slow ones"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.core.metrics import format_metric
+
+
+class PoolStats:
+    """Cumulative checkout statistics for a connection pool"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+    
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts_total": self.checkouts,
+                "checkout_timeouts_total": self.timeouts,
+                "checkout_wait_seconds_total": round(self.wait_seconds_total, 6),
+                "checkout_wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def get_pool_status(engine: Engine) -> Dict[str, Any]:
+    """Current pool occupancy plus cumulative checkout statistics"""
+    pool = engine.pool
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+# get_pool_status key -> (metric name, type, help)
+POOL_METRICS = {
+    "size": ("db_pool_size", "gauge", "Connections kept open by the pool"),
+    "checked_out": ("db_pool_checked_out", "gauge", "Connections currently in use"),
+    "checked_in": ("db_pool_checked_in", "gauge", "Idle connections in the pool"),
+    "overflow": ("db_pool_overflow", "gauge", "Overflow connections currently open"),
+    "checkouts_total": ("db_pool_checkouts_total", "counter", "Successful connection checkouts"),
+    "checkout_timeouts_total": ("db_pool_checkout_timeouts_total", "counter", "Checkouts that timed out"),
+    "checkout_wait_seconds_total": ("db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a connection"),
+    "checkout_wait_seconds_max": ("db_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a connection"),
+}
+
+
+def pool_metrics(engine: Engine) -> List[str]:
+    """``get_pool_status`` as Prometheus exposition lines"""
+    status = get_pool_status(engine)
+    lines: List[str] = []
+    for key, (name, kind, help_text) in POOL_METRICS.items():
+        if key in status:
+            lines.extend(format_metric(name, kind, help_text, [("", {}, status[key])]))
+    return lines
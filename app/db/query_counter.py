@@ -0,0 +1,34 @@
+from typing import List, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class QueryCounter:
+    """
+    Records the SQL statements an engine executes while the block runs, to
+    catch N+1 query patterns:
+
+        with QueryCounter(engine) as queries:
+            client.get("/api/v1/appointments/")
+        assert queries.count <= 3, queries.statements
+    """
+    
+    def __init__(self, engine: Union[Engine, AsyncEngine]):
+        self.engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        self.statements: List[str] = []
+    
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+    
+    def _record(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+    
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._record)
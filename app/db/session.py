@@ -1,15 +1,126 @@
-from sqlalchemy import create_engine
+from typing import AsyncGenerator, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import ORMExecuteState, Session, raiseload, sessionmaker
 
 from app.core.config import settings
+from app.db.instrumentation import instrument_engine
+from app.db.pool import InstrumentedQueuePool
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _engine_options(url, is_async: bool = False) -> dict:
+    """Pool and driver options for the configured database"""
+    database_url = make_url(url)
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    
+    if database_url.get_backend_name() == "sqlite":
+        # Sessions are used from FastAPI's threadpool, not the creating thread
+        options["connect_args"] = {"check_same_thread": False}
+        if database_url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+            return options
+    elif database_url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        if database_url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    
+    if not is_async:
+        # Async engines need SQLAlchemy's asyncio-aware pool
+        options["poolclass"] = InstrumentedQueuePool
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
+
+def get_async_database_url() -> URL:
+    if settings.ASYNC_DATABASE_URL:
+        return make_url(settings.ASYNC_DATABASE_URL)
+    database_url = make_url(settings.DATABASE_URL)
+    drivername = ASYNC_DRIVERS.get(database_url.get_backend_name(), database_url.drivername)
+    return database_url.set(drivername=drivername)
+
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+instrument_engine(engine)
 
-engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _raise_on_lazy_load(orm_execute_state: ORMExecuteState) -> None:
+    # Relationships must be loaded with explicit loader options (selectinload,
+    # joinedload, contains_eager); touching any other one raises
+    if orm_execute_state.is_select and not (
+        orm_execute_state.is_relationship_load or orm_execute_state.is_column_load
+    ):
+        orm_execute_state.statement = orm_execute_state.statement.options(raiseload("*", sql_only=True))
+
+
+if settings.SQL_RAISELOAD:
+    # Session is also the sync class behind AsyncSession
+    event.listen(Session, "do_orm_execute", _raise_on_lazy_load)
+
+# The async engine is created on first use so scripts and the sync API do not
+# require the asyncpg / aiosqlite drivers to be installed.
+_async_engine: Optional[AsyncEngine] = None
+_AsyncSessionLocal: Optional[sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        async_url = get_async_database_url()
+        _async_engine = create_async_engine(async_url, **_engine_options(async_url, is_async=True))
+        if _async_engine.dialect.name == "sqlite":
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        instrument_engine(_async_engine.sync_engine)
+    return _async_engine
+
+
+def get_async_sessionmaker() -> sessionmaker:
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        # Objects stay usable after commit; lazy refreshes would need an await
+        _AsyncSessionLocal = sessionmaker(
+            bind=get_async_engine(),
+            class_=AsyncSession,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _AsyncSessionLocal
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with get_async_sessionmaker()() as db:
+        yield db
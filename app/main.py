@@ -1,17 +1,31 @@
 from fastapi import FastAPI, Request, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
+try:
+    from fastapi.routing import iter_route_contexts
+except ImportError:
+    # Older FastAPI copies included routes, so their own path is the full template
+    iter_route_contexts = None
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-import time
-import traceback
+import logging
 
-from app.core.logging import logger
+from app.core.logging import REQUEST_ID_HEADER, access_logger, logger, set_request_id
 
+from app.api.pagination import NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, http_request_duration, http_requests_in_progress, registry
+from app.core.request_stats import start_request_stats
+from app.core.security import PasswordHasherBusy
+from app.db.pool import get_pool_status, pool_metrics
 from app.db.session import engine, get_db
 from app.models.base import Base
+from app.services.catalogue_cache import catalogue_cache
+from app.services.token_revocation import token_revocations
+from app.services.voice_parsers import parser_stats
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -29,39 +43,91 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, REQUEST_ID_HEADER, "ETag", "Last-Modified"],
     )
 
+# id(route) -> full path template, for routes FastAPI matched through an included router
+_route_paths = {}
+
+
+def route_template(request: Request) -> str:
+    """Metric label for the request: /api/v1/appointments/{appointment_id}, not the raw path"""
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Routes of included routers keep the path relative to their router; map
+    # them to the path with the include prefixes (built once, on first use)
+    if iter_route_contexts is not None and not _route_paths:
+        _route_paths.update((id(context.original_route), context.path) for context in iter_route_contexts(app.routes))
+    return _route_paths.get(id(route), route.path)
+
+
 # Add request processing middleware for audit logging
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+    # SQL and LLM time of the request accumulate in stats (see app.core.request_stats)
+    stats = start_request_stats()
+    # Every log line of the request carries this ID; it is echoed back to the caller
+    request_id = set_request_id(request.headers.get(REQUEST_ID_HEADER))
+    http_requests_in_progress.inc()
+    response = None
+    try:
+        response = await call_next(request)
+        response.headers["X-Process-Time"] = str(stats.elapsed())
+        response.headers["Server-Timing"] = stats.server_timing()
+        response.headers[REQUEST_ID_HEADER] = request_id
+        return response
+    finally:
+        http_requests_in_progress.dec()
+        # An exception escaping call_next is answered with a 500 by the server
+        status_code = response.status_code if response is not None else 500
+        http_request_duration.observe(
+            stats.elapsed(), method=request.method, route=route_template(request), status=str(status_code)
+        )
+        fields = stats.log_fields()
+        access_logger.log(
+            logging.ERROR if status_code >= 500 else logging.INFO,
+            "%s %s %d %.1fms (db: %d queries %.1fms, llm: %.1fms)",
+            request.method, request.url.path, status_code, fields["duration_ms"],
+            fields["db_queries"], fields["db_ms"], fields["llm_ms"],
+            extra=fields,
+        )
 
 # Exception handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     error_msg = f"Unhandled error: {str(exc)}"
-    logger.error(f"{error_msg}\n{traceback.format_exc()}")
+    # The traceback is formatted by the logging thread, not here
+    logger.error("Unhandled error on %s %s: %s", request.method, request.url.path, exc, exc_info=exc)
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": error_msg},
     )
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    # Login storm: shed load instead of queueing bcrypt work without bound
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many sign-in requests, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     error_details = exc.errors()
-    logger.error(f"Validation error: {error_details}")
+    logger.error("Validation error: %s", error_details)
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        content={"detail": error_details},
+        # Errors raised by validators carry the exception object in ctx
+        content={"detail": jsonable_encoder(error_details)},
     )
 
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+registry.add_collector(lambda: pool_metrics(engine))
+
 
 @app.get("/")
 def root():
@@ -72,7 +138,7 @@ def root():
 def health_check(db: Session = Depends(get_db)):
     try:
         # Try to execute a simple query to check DB connection
-        db.execute("SELECT 1")
+        db.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected"
@@ -82,4 +148,35 @@ def health_check(db: Session = Depends(get_db)):
             "status": "unhealthy",
             "database": "disconnected",
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+
+@app.get("/health/db-pool")
+def db_pool_status():
+    """Connection pool occupancy and checkout wait statistics"""
+    return get_pool_status(engine)
+
+
+@app.get("/health/voice-parsers")
+def voice_parser_status():
+    """How often voice steps were resolved locally instead of by the LLM"""
+    return parser_stats.snapshot()
+
+
+@app.get("/health/catalogue-cache")
+def catalogue_cache_status():
+    """Hit/miss counts of the hospital/department/doctor catalogue cache"""
+    return catalogue_cache.stats()
+
+
+
+@app.get("/health/token-revocations")
+def token_revocation_status():
+    """Size and sync state of the in-memory access token revocation list"""
+    return token_revocations.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Request, database, LLM and booking metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
\ No newline at end of file
@@ -4,4 +4,5 @@ from app.models.hospital import Hospital
 from app.models.department import Department
 from app.models.doctor import Doctor
 from app.models.patient import Patient
-from app.models.appointment import Appointment
\ No newline at end of file
+from app.models.appointment import Appointment
+from app.models.refresh_token import RefreshToken
\ No newline at end of file
@@ -1,10 +1,28 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, DateTime, Enum, Numeric
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, Time, DateTime, Enum, Numeric, Index, text
 from sqlalchemy.orm import relationship
 
 from app.models.base import Base, AuditMixin
 
 class Appointment(Base, AuditMixin):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Double-booking checks, slot availability and doctor schedules
+        Index("ix_appointments_doctor_slot", "doctor_id", "appointment_date", "appointment_time", "status"),
+        # Patient appointment lists and the voice check/cancel flow
+        Index("ix_appointments_patient_status", "patient_id", "status"),
+        # Hospital-scoped appointment lists
+        Index("ix_appointments_hospital_date", "hospital_id", "appointment_date"),
+        # Keyset pagination of appointment lists
+        Index("ix_appointments_date_time_id", "appointment_date", "appointment_time", "id"),
+        # A doctor can only hold one active appointment per start time
+        Index(
+            "uq_appointments_active_doctor_slot",
+            "doctor_id", "appointment_date", "appointment_time",
+            unique=True,
+            postgresql_where=text("status IN ('scheduled', 'confirmed')"),
+            sqlite_where=text("status IN ('scheduled', 'confirmed')"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
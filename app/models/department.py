@@ -9,7 +9,7 @@ class Department(Base, AuditMixin):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
-    hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=False)
+    hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=False, index=True)
     head_doctor_id = Column(Integer, ForeignKey("doctors.id"), nullable=True)
     is_active = Column(Boolean, default=True)
 
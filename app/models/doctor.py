@@ -12,8 +12,8 @@ class Doctor(Base, AuditMixin):
     email = Column(String, nullable=False)
     phone = Column(String, nullable=False)
     specialty = Column(String, nullable=False)
-    department_id = Column(Integer, ForeignKey("departments.id"), nullable=False)
-    hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=False)
+    department_id = Column(Integer, ForeignKey("departments.id"), nullable=False, index=True)
+    hospital_id = Column(Integer, ForeignKey("hospitals.id"), nullable=False, index=True)
     specialization = Column(String, nullable=True)
     qualification = Column(String, nullable=True)
     experience_years = Column(Integer, nullable=True)
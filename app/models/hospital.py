@@ -13,7 +13,7 @@ class Hospital(Base, AuditMixin):
     email = Column(String, nullable=False)
     website = Column(String, nullable=True)
     description = Column(String, nullable=True)
-    admin_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    admin_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     status = Column(Enum("active", "inactive", "pending", name="hospital_status"), default="pending")
     license_number = Column(String, nullable=True)
     established_year = Column(Integer, nullable=True)
@@ -10,7 +10,7 @@ class Patient(Base, AuditMixin):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     full_name = Column(String, nullable=False)
     email = Column(String, nullable=True)
-    phone = Column(String, nullable=False)
+    phone = Column(String, nullable=False, index=True)
     date_of_birth = Column(Date, nullable=True)
     gender = Column(Enum("male", "female", "other", name="gender_type"), nullable=True)
     address = Column(String, nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, text
 from sqlalchemy.orm import relationship
 
 from app.models.base import Base, AuditMixin
@@ -17,8 +17,12 @@ class User(Base, AuditMixin):
     phone_verified = Column(Boolean, default=False)
     last_login_at = Column(DateTime, nullable=True)
     profile_picture = Column(String, nullable=True)
+    # Access tokens carry the version they were issued at; bumping it revokes them
+    token_version = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    tokens_revoked_at = Column(DateTime, nullable=True, index=True)
 
     # Relationships
     managed_hospitals = relationship("Hospital", back_populates="admin")
     doctor_profile = relationship("Doctor", back_populates="user", uselist=False)
-    patient_profile = relationship("Patient", back_populates="user", uselist=False)
\ No newline at end of file
+    patient_profile = relationship("Patient", back_populates="user", uselist=False)
+    refresh_tokens = relationship("RefreshToken", back_populates="user", passive_deletes=True)
\ No newline at end of file
@@ -5,5 +5,7 @@ from app.schemas.doctor_summary import DoctorSummary
 from app.schemas.department import Department, DepartmentCreate, DepartmentUpdate
 from app.schemas.doctor import Doctor, DoctorCreate, DoctorUpdate
 from app.schemas.patient import Patient, PatientCreate, PatientUpdate
-from app.schemas.appointment import Appointment, AppointmentCreate, AppointmentUpdate
-from app.schemas.token import Token, TokenPayload
\ No newline at end of file
+from app.schemas.appointment import Appointment, AppointmentBatchCreate, AppointmentBatchResult, AppointmentCreate, AppointmentImport, AppointmentUpdate
+from app.schemas.token import Token, TokenPayload, TokenRefresh
+from app.schemas.availability import TimeSlot, DoctorSlots
+from app.schemas.bulk_import import BulkImportResult, BulkRowError
\ No newline at end of file
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime, date, time
 
+from app.schemas.bulk_import import BulkRowError
+
 
 class AppointmentBase(BaseModel):
     patient_id: int
@@ -23,6 +25,19 @@ class AppointmentCreate(AppointmentBase):
     booking_reference: str
 
 
+class AppointmentImport(AppointmentBase):
+    # Kept when migrating existing bookings; generated when missing
+    booking_reference: Optional[str] = None
+
+
+class AppointmentBatchCreate(BaseModel):
+    # Booking references are generated for every appointment
+    appointments: List[AppointmentBase] = Field(..., min_items=1, max_items=100)
+    # all_or_nothing books none of the appointments if any slot is taken;
+    # best_effort books the free ones and reports the rest
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+
+
 class AppointmentUpdate(BaseModel):
     appointment_date: Optional[date] = None
     appointment_time: Optional[time] = None
@@ -48,7 +63,13 @@ class AppointmentInDBBase(AppointmentBase):
 
     class Config:
         orm_mode = True
+        from_attributes = True
 
 
 class Appointment(AppointmentInDBBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class AppointmentBatchResult(BaseModel):
+    created: List[Appointment]
+    errors: List[BulkRowError] = []  # row is the 1-based position in the request
\ No newline at end of file
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import datetime
+
+
+class TimeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+
+class DoctorSlots(BaseModel):
+    doctor_id: int
+    full_name: str
+    slots: List[TimeSlot]
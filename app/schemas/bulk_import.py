@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List
+
+
+class BulkRowError(BaseModel):
+    row: int  # 1-based position in the uploaded array or CSV (excluding the header)
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    received: int
+    created: int
+    failed: int
+    errors: List[BulkRowError] = []  # at most the first 1000
\ No newline at end of file
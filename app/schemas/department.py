@@ -29,6 +29,7 @@ class DepartmentInDBBase(DepartmentBase):
 
     class Config:
         orm_mode = True
+        from_attributes = True
 
 
 class Department(DepartmentInDBBase):
@@ -1,7 +1,19 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, Dict, Any
 from datetime import datetime
 
+# Longest slot in Doctor.availability["slot_minutes"]; it must fit in a day
+MAX_SLOT_MINUTES = 24 * 60
+
+
+def _check_availability(availability: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    slot_minutes = (availability or {}).get("slot_minutes")
+    if slot_minutes is None:
+        return availability
+    if isinstance(slot_minutes, bool) or not isinstance(slot_minutes, int) or not 0 < slot_minutes <= MAX_SLOT_MINUTES:
+        raise ValueError(f"slot_minutes must be a whole number of minutes between 1 and {MAX_SLOT_MINUTES}")
+    return availability
+
 
 class DoctorBase(BaseModel):
     full_name: str
@@ -25,6 +37,8 @@ class DoctorBase(BaseModel):
 class DoctorCreate(DoctorBase):
     user_id: Optional[int] = None
 
+    _check_availability = validator("availability", allow_reuse=True)(_check_availability)
+
 
 class DoctorUpdate(BaseModel):
     full_name: Optional[str] = None
@@ -43,6 +57,8 @@ class DoctorUpdate(BaseModel):
     is_active: Optional[bool] = None
     license_number: Optional[str] = None
 
+    _check_availability = validator("availability", allow_reuse=True)(_check_availability)
+
 
 class DoctorInDBBase(DoctorBase):
     id: int
@@ -52,6 +68,7 @@ class DoctorInDBBase(DoctorBase):
 
     class Config:
         orm_mode = True
+        from_attributes = True
 
 
 class Doctor(DoctorInDBBase):
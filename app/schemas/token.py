@@ -1,12 +1,25 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    # Seconds until the access token expires
+    expires_in: Optional[int] = None
+    refresh_token: Optional[str] = None
+
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
 
 
 class TokenPayload(BaseModel):
     sub: Optional[int] = None
-    role: Optional[str] = None
\ No newline at end of file
+    role: Optional[str] = None
+    # The user's token_version when the token was issued
+    ver: int = 0
+    email: Optional[str] = None
+    doctor_id: Optional[int] = None
+    patient_id: Optional[int] = None
+    hospital_ids: List[int] = []
\ No newline at end of file
@@ -1,35 +1,224 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import functools
 import json
-import uuid
 from datetime import datetime, date, time
 
-from sqlalchemy.orm import Session
-import openai
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from twilio.twiml.voice_response import VoiceResponse, Gather
 
-from app.core.config import settings
+from app.core.logging import logger
 from app.models.patient import Patient
 from app.models.doctor import Doctor
 from app.models.hospital import Hospital
-from app.models.department import Department
 from app.models.appointment import Appointment
+from app.services.booking import SlotUnavailableError, generate_booking_reference, reserve_slot
+from app.services.call_session import BOOKING_STEPS, CallSession
+from app.services.catalogue_cache import catalogue_cache
+from app.services.llm import LLMClient, LLMError, get_llm_client
+from app.services.name_matcher import get_name_index
+from app.services.voice_parsers import (
+    parse_date, parse_intent, parse_navigation, parse_number, parse_time, parser_stats, resolve
+)
+
+
+def handle_llm_errors(method):
+    """Answer with an apology instead of failing the webhook when the LLM is unavailable"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await method(self, *args, **kwargs)
+        except LLMError as e:
+            logger.warning("Voice step %s failed: %s", method.__name__, e)
+            await self.db.rollback()
+            response = VoiceResponse()
+            response.say("I'm sorry, I'm having trouble understanding right now. Please try again in a few minutes.")
+            return str(response)
+    return wrapper
 
 
 class AIVoiceAssistant:
     """AI Voice Assistant for handling appointment booking via phone calls"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, session: Optional[CallSession] = None, llm: Optional[LLMClient] = None):
         self.db = db
-        openai.api_key = settings.OPENAI_API_KEY
+        self.session = session or CallSession(call_sid="")
+        self.llm = llm or get_llm_client()
+    
+    async def _first(self, statement):
+        result = await self.db.execute(statement)
+        return result.scalars().first()
+    
+    async def _all(self, statement):
+        result = await self.db.execute(statement)
+        return result.scalars().all()
+    
+    async def _complete(self, prompt: str, step: str) -> str:
+        """Run a completion through the shared LLM client (deadline, retries, breaker)"""
+        return await self.llm.complete(prompt, step=step)
+    
+    async def _patient_id(self, phone_number: str) -> Optional[int]:
+        """Caller's patient ID, looked up by phone once per call"""
+        if self.session.patient_id is None:
+            patient = await self._first(select(Patient).where(Patient.phone == phone_number))
+            if patient:
+                self.session.patient_id = patient.id
+                self.session.patient_name = patient.full_name
+        return self.session.patient_id
+    
+    async def _match_name(self, kind: str, speech_result: str, step: str) -> Optional[Tuple[int, str]]:
+        """Match a spoken name locally; the LLM only breaks ties or handles no close match"""
+        candidates = self.session.candidates.get(kind) or await self._load_candidates(kind)
+        index = get_name_index(kind, candidates)
+        match = index.match(speech_result or "")
+        parser_stats.record(step, match.id is not None)
+        matched_id = match.id
+        if matched_id is None and match.shortlist:
+            names = [name for _, name in match.shortlist]
+            prompt = f"From this speech: '{speech_result}', which {kind} is being referred to from this list: {names}? Return just the {kind} name."
+            matched_id = index.lookup(await self._complete(prompt, step))
+        if matched_id is None:
+            return None
+        return matched_id, index.names[matched_id]
+    
+    async def _load_candidates(self, kind: str) -> List[Tuple[int, str]]:
+        """Active hospitals, departments or doctors for the current selections, from the catalogue cache"""
+        if kind == "hospital":
+            snapshots = catalogue_cache.peek_all() or await self.db.run_sync(catalogue_cache.get_all)
+            candidates = [
+                (s.hospital["id"], s.hospital["name"]) for s in snapshots if s.hospital["status"] == "active"
+            ]
+        else:
+            hospital_id = self.session.hospital_id
+            snapshot = catalogue_cache.peek(hospital_id) or await self.db.run_sync(catalogue_cache.get, hospital_id)
+            if snapshot is None:
+                candidates = []
+            elif kind == "department":
+                candidates = [(d["id"], d["name"]) for d in snapshot.departments if d["is_active"]]
+            else:
+                candidates = [
+                    (d["id"], d["full_name"]) for d in snapshot.doctors
+                    if d["is_active"] and d["department_id"] == self.session.department_id
+                ]
+        self.session.candidates[kind] = candidates
+        return candidates
+    
+    # Questions of the booking flow. Each records the step being asked and the
+    # candidates read out, so the answer is matched without re-querying.
+    
+    async def _ask_hospital(self, intro: str = "") -> VoiceResponse:
+        hospitals = await self._load_candidates("hospital")
+        self.session.step = "hospital"
+        
+        response = VoiceResponse()
+        gather = Gather(input="speech", action="/api/v1/voice/select-hospital", method="POST")
+        hospital_names = ", ".join([name for _, name in hospitals])
+        gather.say(f"{intro} We have the following hospitals available: {hospital_names}. Please say the name of the hospital you'd like to book with.".strip())
+        response.append(gather)
+        return response
+    
+    async def _ask_department(self, intro: str = "") -> VoiceResponse:
+        departments = await self._load_candidates("department")
+        self.session.step = "department"
+        
+        response = VoiceResponse()
+        gather = Gather(input="speech", action="/api/v1/voice/select-department", method="POST")
+        department_names = ", ".join([name for _, name in departments])
+        gather.say(f"{intro} We have the following departments: {department_names}. Please say which department you need.".strip())
+        response.append(gather)
+        return response
+    
+    async def _ask_doctor(self, intro: str = "") -> VoiceResponse:
+        doctors = await self._load_candidates("doctor")
+        self.session.step = "doctor"
+        
+        response = VoiceResponse()
+        gather = Gather(input="speech", action="/api/v1/voice/select-doctor", method="POST")
+        doctor_names = ", ".join([f"Dr. {name}" for _, name in doctors])
+        gather.say(f"{intro} We have the following doctors: {doctor_names}. Please say which doctor you'd like to see.".strip())
+        response.append(gather)
+        return response
+    
+    async def _ask_date(self, intro: str = "") -> VoiceResponse:
+        self.session.step = "date"
+        response = VoiceResponse()
+        gather = Gather(input="speech", action="/api/v1/voice/select-date", method="POST")
+        gather.say(f"{intro} Please say the date you'd like to book, for example, 'June 15th'.".strip())
+        response.append(gather)
+        return response
+    
+    async def _ask_time(self, intro: str = "") -> VoiceResponse:
+        self.session.step = "time"
+        response = VoiceResponse()
+        gather = Gather(input="speech", action="/api/v1/voice/select-time", method="POST")
+        gather.say(f"{intro} Please say the time you'd like to book, for example, '2:30 PM'.".strip())
+        response.append(gather)
+        return response
+    
+    async def _ask(self, step: str, intro: str = "") -> str:
+        ask = {
+            "hospital": self._ask_hospital,
+            "department": self._ask_department,
+            "doctor": self._ask_doctor,
+            "date": self._ask_date,
+            "time": self._ask_time,
+        }[step]
+        return str(await ask(intro))
+    
+    async def _resume(self, step: str, speech_result: str) -> Optional[str]:
+        """Handle "go back" / "start over", or re-ask when earlier answers are missing.
+        
+        Returns the TwiML to send, or None when the step should proceed normally.
+        """
+        navigation = parse_navigation(speech_result)
+        if navigation == "restart":
+            self.session.reset_booking()
+            return await self._ask("hospital", "Okay, let's start over.")
+        if navigation == "back":
+            previous = BOOKING_STEPS[max(BOOKING_STEPS.index(step) - 1, 0)]
+            self.session.clear_from(previous)
+            return await self._ask(previous, "Okay, let's go back.")
+        
+        # Session expired or the call skipped a step: ask the first unanswered question
+        for earlier in BOOKING_STEPS[:BOOKING_STEPS.index(step)]:
+            field = {"hospital": "hospital_id", "department": "department_id", "doctor": "doctor_id", "date": "date"}[earlier]
+            if getattr(self.session, field) is None:
+                return await self._ask(earlier, "Sorry, I lost track of your booking.")
+        return None
     
-    def handle_incoming_call(self, phone_number: str) -> str:
+    async def _read_appointments(self, response: VoiceResponse, patient_id: Optional[int]) -> list:
+        # Doctor and hospital come from the same query, not one query each per appointment
+        appointments = await self._all(
+            select(Appointment)
+            .join(Appointment.doctor)
+            .join(Appointment.hospital)
+            .options(contains_eager(Appointment.doctor), contains_eager(Appointment.hospital))
+            .where(
+                Appointment.patient_id == patient_id,
+                Appointment.status.in_(["scheduled", "confirmed"])
+            )
+            .order_by(Appointment.id)
+        )
+        
+        if appointments:
+            response.say(f"You have {len(appointments)} upcoming appointments.")
+            for i, appt in enumerate(appointments):
+                response.say(
+                    f"Appointment {i+1}: {appt.appointment_date.strftime('%B %d')} at "
+                    f"{appt.appointment_time.strftime('%I:%M %p')} with Dr. {appt.doctor.full_name} "
+                    f"at {appt.hospital.name}."
+                )
+        return appointments
+    
+    async def handle_incoming_call(self, phone_number: str) -> str:
         """Handle incoming call and return TwiML response"""
         # Check if patient exists
-        patient = self.db.query(Patient).filter(Patient.phone == phone_number).first()
+        patient_id = await self._patient_id(phone_number)
         
         response = VoiceResponse()
         
-        if not patient:
+        if not patient_id:
             # New patient flow
             response.say("Welcome to our Hospital Appointment Booking System. It seems like this is your first time calling.")
             gather = Gather(input="speech", action="/api/v1/voice/collect-patient-info", method="POST")
@@ -38,7 +227,7 @@ class AIVoiceAssistant:
             response.say("We didn't receive any input. Please call again.")
         else:
             # Existing patient flow
-            response.say(f"Welcome back {patient.full_name} to our Hospital Appointment Booking System.")
+            response.say(f"Welcome back {self.session.patient_name} to our Hospital Appointment Booking System.")
             gather = Gather(input="speech", action="/api/v1/voice/appointment-options", method="POST")
             gather.say("Would you like to book a new appointment, check your existing appointments, or cancel an appointment?")
             response.append(gather)
@@ -46,16 +235,12 @@ class AIVoiceAssistant:
         
         return str(response)
     
-    def process_patient_info(self, speech_result: str, phone_number: str) -> str:
+    @handle_llm_errors
+    async def process_patient_info(self, speech_result: str, phone_number: str) -> str:
         """Process patient information and create a new patient record"""
         # Use OpenAI to extract name from speech
         prompt = f"Extract the full name from this speech: '{speech_result}'"
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        full_name = completion.choices[0].text.strip()
+        full_name = await self._complete(prompt, "extract_name")
         
         # Create new patient
         patient = Patient(
@@ -64,8 +249,10 @@ class AIVoiceAssistant:
             created_by="ai_voice_system"
         )
         self.db.add(patient)
-        self.db.commit()
-        self.db.refresh(patient)
+        await self.db.commit()
+        await self.db.refresh(patient)
+        self.session.patient_id = patient.id
+        self.session.patient_name = patient.full_name
         
         response = VoiceResponse()
         response.say(f"Thank you {full_name}. Your information has been registered.")
@@ -75,72 +262,40 @@ class AIVoiceAssistant:
         
         return str(response)
     
-    def process_appointment_options(self, speech_result: str, phone_number: str) -> str:
+    @handle_llm_errors
+    async def process_appointment_options(self, speech_result: str, phone_number: str) -> str:
         """Process appointment options based on speech input"""
-        # Use OpenAI to understand intent
-        prompt = f"Classify this speech into one of these intents: 'book_appointment', 'check_appointments', 'cancel_appointment', 'other': '{speech_result}'"
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        intent = completion.choices[0].text.strip().lower()
+        # Keyword match first; only ambiguous speech goes to OpenAI
+        intent = resolve("classify_intent", parse_intent, speech_result)
+        if intent is None:
+            prompt = f"Classify this speech into one of these intents: 'book_appointment', 'check_appointments', 'cancel_appointment', 'other': '{speech_result}'"
+            intent = (await self._complete(prompt, "classify_intent")).lower()
         
         response = VoiceResponse()
         
         if "book_appointment" in intent:
             # Start booking flow
-            gather = Gather(input="speech", action="/api/v1/voice/select-hospital", method="POST")
-            hospitals = self.db.query(Hospital).filter(Hospital.status == "active").all()
-            hospital_names = ", ".join([h.name for h in hospitals])
-            gather.say(f"We have the following hospitals available: {hospital_names}. Please say the name of the hospital you'd like to book with.")
-            response.append(gather)
+            self.session.reset_booking()
+            return await self._ask("hospital")
         
         elif "check_appointments" in intent:
             # Check existing appointments
-            patient = self.db.query(Patient).filter(Patient.phone == phone_number).first()
-            appointments = self.db.query(Appointment).filter(
-                Appointment.patient_id == patient.id,
-                Appointment.status.in_(["scheduled", "confirmed"])
-            ).all()
-            
+            appointments = await self._read_appointments(response, await self._patient_id(phone_number))
             if not appointments:
                 response.say("You don't have any upcoming appointments.")
-            else:
-                response.say(f"You have {len(appointments)} upcoming appointments.")
-                for i, appt in enumerate(appointments):
-                    doctor = self.db.query(Doctor).filter(Doctor.id == appt.doctor_id).first()
-                    hospital = self.db.query(Hospital).filter(Hospital.id == appt.hospital_id).first()
-                    response.say(
-                        f"Appointment {i+1}: {appt.appointment_date.strftime('%B %d')} at "
-                        f"{appt.appointment_time.strftime('%I:%M %p')} with Dr. {doctor.full_name} "
-                        f"at {hospital.name}."
-                    )
             
             response.say("Thank you for calling. Goodbye!")
         
         elif "cancel_appointment" in intent:
             # Cancel appointment flow
-            patient = self.db.query(Patient).filter(Patient.phone == phone_number).first()
-            appointments = self.db.query(Appointment).filter(
-                Appointment.patient_id == patient.id,
-                Appointment.status.in_(["scheduled", "confirmed"])
-            ).all()
+            appointments = await self._read_appointments(response, await self._patient_id(phone_number))
+            self.session.appointment_ids = [appt.id for appt in appointments]
             
             if not appointments:
                 response.say("You don't have any upcoming appointments to cancel.")
                 response.say("Thank you for calling. Goodbye!")
             else:
-                response.say(f"You have {len(appointments)} upcoming appointments.")
-                for i, appt in enumerate(appointments):
-                    doctor = self.db.query(Doctor).filter(Doctor.id == appt.doctor_id).first()
-                    hospital = self.db.query(Hospital).filter(Hospital.id == appt.hospital_id).first()
-                    response.say(
-                        f"Appointment {i+1}: {appt.appointment_date.strftime('%B %d')} at "
-                        f"{appt.appointment_time.strftime('%I:%M %p')} with Dr. {doctor.full_name} "
-                        f"at {hospital.name}."
-                    )
-                
+                self.session.step = "cancel"
                 gather = Gather(input="speech dtmf", action="/api/v1/voice/cancel-appointment", method="POST", numDigits=1)
                 gather.say("Please say or press the number of the appointment you want to cancel.")
                 response.append(gather)
@@ -150,266 +305,177 @@ class AIVoiceAssistant:
         
         return str(response)
     
-    def process_hospital_selection(self, speech_result: str, phone_number: str) -> str:
+    @handle_llm_errors
+    async def process_hospital_selection(self, speech_result: str, phone_number: str) -> str:
         """Process hospital selection for appointment booking"""
-        # Use OpenAI to extract hospital name
-        hospitals = self.db.query(Hospital).filter(Hospital.status == "active").all()
-        hospital_names = [h.name for h in hospitals]
-        
-        prompt = f"From this speech: '{speech_result}', which hospital is being referred to from this list: {hospital_names}? Return just the hospital name."
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        selected_hospital = completion.choices[0].text.strip()
+        resumed = await self._resume("hospital", speech_result)
+        if resumed:
+            return resumed
         
-        hospital = self.db.query(Hospital).filter(Hospital.name == selected_hospital).first()
-        if not hospital:
-            response = VoiceResponse()
-            response.say("I'm sorry, I couldn't find that hospital. Please try again.")
-            return str(response)
-        
-        # Get departments for the hospital
-        departments = self.db.query(Department).filter(
-            Department.hospital_id == hospital.id,
-            Department.is_active == True
-        ).all()
-        
-        response = VoiceResponse()
-        gather = Gather(input="speech", action=f"/api/v1/voice/select-department?hospital_id={hospital.id}", method="POST")
-        department_names = ", ".join([d.name for d in departments])
-        gather.say(f"You selected {hospital.name}. We have the following departments: {department_names}. Please say which department you need.")
-        response.append(gather)
+        matched = await self._match_name("hospital", speech_result, "match_hospital")
+        if not matched:
+            return await self._ask("hospital", "I'm sorry, I couldn't find that hospital.")
         
-        return str(response)
+        self.session.hospital_id, self.session.hospital_name = matched
+        return await self._ask("department", f"You selected {self.session.hospital_name}.")
     
-    def process_department_selection(self, speech_result: str, phone_number: str, hospital_id: int) -> str:
+    @handle_llm_errors
+    async def process_department_selection(self, speech_result: str, phone_number: str) -> str:
         """Process department selection for appointment booking"""
-        # Use OpenAI to extract department name
-        departments = self.db.query(Department).filter(
-            Department.hospital_id == hospital_id,
-            Department.is_active == True
-        ).all()
-        department_names = [d.name for d in departments]
-        
-        prompt = f"From this speech: '{speech_result}', which department is being referred to from this list: {department_names}? Return just the department name."
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        selected_department = completion.choices[0].text.strip()
-        
-        department = self.db.query(Department).filter(
-            Department.name == selected_department,
-            Department.hospital_id == hospital_id
-        ).first()
+        resumed = await self._resume("department", speech_result)
+        if resumed:
+            return resumed
         
-        if not department:
-            response = VoiceResponse()
-            response.say("I'm sorry, I couldn't find that department. Please try again.")
-            return str(response)
-        
-        # Get doctors for the department
-        doctors = self.db.query(Doctor).filter(
-            Doctor.department_id == department.id,
-            Doctor.is_active == True
-        ).all()
-        
-        response = VoiceResponse()
-        gather = Gather(
-            input="speech", 
-            action=f"/api/v1/voice/select-doctor?hospital_id={hospital_id}&department_id={department.id}", 
-            method="POST"
-        )
-        doctor_names = ", ".join([f"Dr. {d.full_name}" for d in doctors])
-        gather.say(f"You selected {department.name} department. We have the following doctors: {doctor_names}. Please say which doctor you'd like to see.")
-        response.append(gather)
+        matched = await self._match_name("department", speech_result, "match_department")
+        if not matched:
+            return await self._ask("department", "I'm sorry, I couldn't find that department.")
         
-        return str(response)
+        self.session.department_id, self.session.department_name = matched
+        return await self._ask("doctor", f"You selected {self.session.department_name} department.")
     
-    def process_doctor_selection(self, speech_result: str, phone_number: str, hospital_id: int, department_id: int) -> str:
+    @handle_llm_errors
+    async def process_doctor_selection(self, speech_result: str, phone_number: str) -> str:
         """Process doctor selection for appointment booking"""
-        # Use OpenAI to extract doctor name
-        doctors = self.db.query(Doctor).filter(
-            Doctor.department_id == department_id,
-            Doctor.hospital_id == hospital_id,
-            Doctor.is_active == True
-        ).all()
-        doctor_names = [f"Dr. {d.full_name}" for d in doctors]
-        
-        prompt = f"From this speech: '{speech_result}', which doctor is being referred to from this list: {doctor_names}? Return just the doctor name without 'Dr.'."
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        selected_doctor = completion.choices[0].text.strip()
+        resumed = await self._resume("doctor", speech_result)
+        if resumed:
+            return resumed
         
-        # Remove "Dr." if present
-        if selected_doctor.lower().startswith("dr."):
-            selected_doctor = selected_doctor[3:].strip()
+        matched = await self._match_name("doctor", speech_result, "match_doctor")
+        if not matched:
+            return await self._ask("doctor", "I'm sorry, I couldn't find that doctor.")
         
-        doctor = self.db.query(Doctor).filter(
-            Doctor.full_name == selected_doctor,
-            Doctor.department_id == department_id
-        ).first()
-        
-        if not doctor:
-            response = VoiceResponse()
-            response.say("I'm sorry, I couldn't find that doctor. Please try again.")
-            return str(response)
-        
-        # Ask for date
-        response = VoiceResponse()
-        gather = Gather(
-            input="speech", 
-            action=f"/api/v1/voice/select-date?hospital_id={hospital_id}&department_id={department_id}&doctor_id={doctor.id}", 
-            method="POST"
-        )
-        gather.say(f"You selected Dr. {doctor.full_name}. Please say the date you'd like to book, for example, 'June 15th'.")
-        response.append(gather)
-        
-        return str(response)
+        self.session.doctor_id, self.session.doctor_name = matched
+        return await self._ask("date", f"You selected Dr. {self.session.doctor_name}.")
     
-    def process_date_selection(self, speech_result: str, phone_number: str, hospital_id: int, department_id: int, doctor_id: int) -> str:
+    @handle_llm_errors
+    async def process_date_selection(self, speech_result: str, phone_number: str) -> str:
         """Process date selection for appointment booking"""
-        # Use OpenAI to extract date
-        prompt = f"From this speech: '{speech_result}', extract the date in YYYY-MM-DD format."
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        date_str = completion.choices[0].text.strip()
-        
-        try:
-            selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        except ValueError:
-            response = VoiceResponse()
-            response.say("I'm sorry, I couldn't understand the date. Please try again with a date like 'June 15th'.")
-            return str(response)
-        
-        # Ask for time
-        response = VoiceResponse()
-        gather = Gather(
-            input="speech", 
-            action=f"/api/v1/voice/select-time?hospital_id={hospital_id}&department_id={department_id}&doctor_id={doctor_id}&date={date_str}", 
-            method="POST"
-        )
-        gather.say(f"You selected {selected_date.strftime('%B %d, %Y')}. Please say the time you'd like to book, for example, '2:30 PM'.")
-        response.append(gather)
+        resumed = await self._resume("date", speech_result)
+        if resumed:
+            return resumed
+        
+        # Parse common date phrases locally, otherwise use OpenAI to extract the date
+        selected_date = resolve("parse_date", parse_date, speech_result)
+        if selected_date is None:
+            prompt = f"Today is {date.today().isoformat()}. From this speech: '{speech_result}', extract the date in YYYY-MM-DD format."
+            date_str = await self._complete(prompt, "parse_date")
+            
+            try:
+                selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+            except ValueError:
+                return await self._ask("date", "I'm sorry, I couldn't understand the date.")
         
-        return str(response)
+        self.session.date = selected_date.isoformat()
+        return await self._ask("time", f"You selected {selected_date.strftime('%B %d, %Y')}.")
     
-    def process_time_selection(self, speech_result: str, phone_number: str, hospital_id: int, department_id: int, doctor_id: int, date_str: str) -> str:
+    @handle_llm_errors
+    async def process_time_selection(self, speech_result: str, phone_number: str) -> str:
         """Process time selection for appointment booking"""
-        # Use OpenAI to extract time
-        prompt = f"From this speech: '{speech_result}', extract the time in HH:MM AM/PM format."
-        completion = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=prompt,
-            max_tokens=50
-        )
-        time_str = completion.choices[0].text.strip()
-        
-        try:
-            selected_time = datetime.strptime(time_str, "%I:%M %p").time()
-        except ValueError:
-            response = VoiceResponse()
-            response.say("I'm sorry, I couldn't understand the time. Please try again with a time like '2:30 PM'.")
-            return str(response)
-        
-        # Check if appointment slot is available
-        selected_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        
-        # Check for existing appointments
-        existing_appointment = self.db.query(Appointment).filter(
-            Appointment.doctor_id == doctor_id,
-            Appointment.appointment_date == selected_date,
-            Appointment.appointment_time == selected_time,
-            Appointment.status.in_(["scheduled", "confirmed"])
-        ).first()
+        resumed = await self._resume("time", speech_result)
+        if resumed:
+            return resumed
+        
+        if self.session.doctor_name is None or self.session.hospital_name is None:
+            # Selections came from query-string fallbacks rather than this session,
+            # and may name rows that no longer exist
+            hospital = await self.db.get(Hospital, self.session.hospital_id)
+            if hospital is None:
+                self.session.clear_from("hospital")
+                return await self._ask("hospital", "Sorry, I lost track of your booking.")
+            doctor = await self.db.get(Doctor, self.session.doctor_id)
+            if doctor is None:
+                self.session.clear_from("doctor")
+                return await self._ask("doctor", "Sorry, I lost track of your booking.")
+            self.session.hospital_name = hospital.name
+            self.session.doctor_name = doctor.full_name
+        
+        # Parse explicit times locally, otherwise use OpenAI to extract the time
+        selected_time = resolve("parse_time", parse_time, speech_result)
+        if selected_time is None:
+            prompt = f"From this speech: '{speech_result}', extract the time in HH:MM AM/PM format."
+            time_str = await self._complete(prompt, "parse_time")
+            
+            try:
+                selected_time = datetime.strptime(time_str, "%I:%M %p").time()
+            except ValueError:
+                return await self._ask("time", "I'm sorry, I couldn't understand the time.")
         
-        if existing_appointment:
-            response = VoiceResponse()
-            response.say("I'm sorry, that time slot is already booked. Please try another time.")
-            return str(response)
+        selected_date = date.fromisoformat(self.session.date)
         
         # Create the appointment
-        patient = self.db.query(Patient).filter(Patient.phone == phone_number).first()
-        doctor = self.db.query(Doctor).filter(Doctor.id == doctor_id).first()
-        hospital = self.db.query(Hospital).filter(Hospital.id == hospital_id).first()
-        department = self.db.query(Department).filter(Department.id == department_id).first()
-        
-        # Generate unique booking reference
-        booking_reference = f"APPT-{uuid.uuid4().hex[:8].upper()}"
-        
         appointment = Appointment(
-            patient_id=patient.id,
-            doctor_id=doctor_id,
-            hospital_id=hospital_id,
-            department_id=department_id,
+            patient_id=await self._patient_id(phone_number),
+            doctor_id=self.session.doctor_id,
+            hospital_id=self.session.hospital_id,
+            department_id=self.session.department_id,
             appointment_date=selected_date,
             appointment_time=selected_time,
             duration_minutes=30,
             appointment_type="consultation",
             status="scheduled",
             booking_source="ai_voice",
-            booking_reference=booking_reference,
+            booking_reference=generate_booking_reference(),
             created_by="ai_voice_system"
         )
         
-        self.db.add(appointment)
-        self.db.commit()
+        # Reserve the slot; fails if it was taken by an overlapping or concurrent booking
+        try:
+            await self.db.run_sync(reserve_slot, appointment)
+        except SlotUnavailableError:
+            return await self._ask("time", "I'm sorry, that time slot is already booked.")
         
         # Confirm appointment
         response = VoiceResponse()
         response.say(
-            f"Great! Your appointment has been booked with Dr. {doctor.full_name} "
-            f"at {hospital.name} on {selected_date.strftime('%B %d, %Y')} "
+            f"Great! Your appointment has been booked with Dr. {self.session.doctor_name} "
+            f"at {self.session.hospital_name} on {selected_date.strftime('%B %d, %Y')} "
             f"at {selected_time.strftime('%I:%M %p')}. "
-            f"Your booking reference is {booking_reference}. "
+            f"Your booking reference is {appointment.booking_reference}. "
             f"Thank you for using our service!"
         )
+        self.session.reset_booking()
         
         return str(response)
     
-    def process_cancel_appointment(self, speech_result: str, phone_number: str) -> str:
+    @handle_llm_errors
+    async def process_cancel_appointment(self, speech_result: str, phone_number: str) -> str:
         """Process appointment cancellation"""
-        # Get the appointment number from speech or DTMF
-        try:
-            if speech_result.isdigit():
-                appointment_num = int(speech_result)
-            else:
+        # Get the appointment number from DTMF or speech ("two", "the second one")
+        appointment_num = resolve("select_appointment", parse_number, speech_result)
+        if appointment_num is None:
+            try:
                 # Use OpenAI to extract number
                 prompt = f"Extract the appointment number (as a digit) from this speech: '{speech_result}'"
-                completion = openai.Completion.create(
-                    engine="text-davinci-003",
-                    prompt=prompt,
-                    max_tokens=50
-                )
-                appointment_num = int(completion.choices[0].text.strip())
-        except (ValueError, IndexError):
-            response = VoiceResponse()
-            response.say("I'm sorry, I couldn't understand which appointment you want to cancel. Please try again.")
-            return str(response)
-        
-        # Get patient's appointments
-        patient = self.db.query(Patient).filter(Patient.phone == phone_number).first()
-        appointments = self.db.query(Appointment).filter(
-            Appointment.patient_id == patient.id,
-            Appointment.status.in_(["scheduled", "confirmed"])
-        ).all()
-        
-        if not appointments or appointment_num < 1 or appointment_num > len(appointments):
+                appointment_num = int(await self._complete(prompt, "select_appointment"))
+            except (ValueError, IndexError):
+                response = VoiceResponse()
+                response.say("I'm sorry, I couldn't understand which appointment you want to cancel. Please try again.")
+                return str(response)
+        
+        # Use the list read to the caller, or rebuild it if the session was lost
+        patient_id = await self._patient_id(phone_number)
+        appointment_ids = self.session.appointment_ids
+        if not appointment_ids:
+            result = await self.db.execute(select(Appointment.id).where(
+                Appointment.patient_id == patient_id,
+                Appointment.status.in_(["scheduled", "confirmed"])
+            ).order_by(Appointment.id))
+            appointment_ids = result.scalars().all()
+        
+        appointment = None
+        if 1 <= appointment_num <= len(appointment_ids):
+            appointment = await self._first(
+                select(Appointment)
+                .options(joinedload(Appointment.doctor))
+                .where(Appointment.id == appointment_ids[appointment_num - 1])
+            )
+        if (not appointment or appointment.patient_id != patient_id
+                or appointment.status not in ("scheduled", "confirmed")):
             response = VoiceResponse()
             response.say("I'm sorry, that's not a valid appointment number. Please try again.")
             return str(response)
         
         # Cancel the appointment
-        appointment = appointments[appointment_num - 1]
         appointment.status = "cancelled"
         appointment.cancelled_by = "patient_via_voice"
         appointment.cancellation_reason = "Cancelled via phone"
@@ -417,13 +483,14 @@ class AIVoiceAssistant:
         appointment.updated_by = "ai_voice_system"
         
         self.db.add(appointment)
-        self.db.commit()
+        await self.db.commit()
+        self.session.appointment_ids = []
+        self.session.step = None
         
         # Confirm cancellation
         response = VoiceResponse()
-        doctor = self.db.query(Doctor).filter(Doctor.id == appointment.doctor_id).first()
         response.say(
-            f"Your appointment with Dr. {doctor.full_name} on "
+            f"Your appointment with Dr. {appointment.doctor.full_name} on "
             f"{appointment.appointment_date.strftime('%B %d, %Y')} at "
             f"{appointment.appointment_time.strftime('%I:%M %p')} has been cancelled. "
             f"Thank you for using our service!"
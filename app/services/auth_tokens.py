@@ -0,0 +1,91 @@
+"""Issuing access and refresh tokens.
+
+Access tokens are JWTs valid for ``ACCESS_TOKEN_EXPIRE_MINUTES`` carrying the
+user's ``Principal`` as claims. Refresh tokens are opaque, stored hashed in
+``refresh_tokens`` and single use: refreshing revokes the presented token and
+returns a new pair. Presenting a refresh token that was already used means it
+was copied, so all of the user's tokens are revoked.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.security import create_access_token, create_refresh_token, hash_refresh_token
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+from app.services.principal import Principal, query_principal_users
+from app.services.token_revocation import token_revocations
+
+
+class InvalidRefreshToken(Exception):
+    """Unknown, expired, revoked or reused refresh token."""
+
+
+def issue_tokens(db: Session, user: User) -> Dict[str, Any]:
+    """
+    Access token for ``user`` (loaded with ``query_principal_users``) and a new
+    refresh token, which is committed. Also drops the user's expired refresh
+    tokens.
+    """
+    principal = Principal.from_user(user)
+    version = user.token_version or 0
+    now = datetime.utcnow()
+    refresh_token, token_hash = create_refresh_token()
+    db.query(RefreshToken).filter(
+        RefreshToken.user_id == user.id, RefreshToken.expires_at < now
+    ).delete(synchronize_session=False)
+    db.add(RefreshToken(
+        token_hash=token_hash,
+        user_id=user.id,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    db.commit()
+    return {
+        "access_token": create_access_token(principal.id, principal.role, version, principal.token_claims()),
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+    }
+
+
+def _use_refresh_token(db: Session, refresh_token: str) -> Optional[int]:
+    """Revoke ``refresh_token`` if it is valid and return its user ID"""
+    now = datetime.utcnow()
+    token_hash = hash_refresh_token(refresh_token)
+    # A conditional update, so two requests racing with the same token cannot both use it
+    used = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == token_hash,
+        RefreshToken.revoked_at.is_(None),
+        RefreshToken.expires_at > now,
+    ).update({RefreshToken.revoked_at: now}, synchronize_session=False)
+    row = db.query(RefreshToken.user_id, RefreshToken.revoked_at).filter(
+        RefreshToken.token_hash == token_hash
+    ).first()
+    if used:
+        return row.user_id
+    db.rollback()
+    if row is not None and row.revoked_at is not None:
+        logger.warning("Refresh token reused for user %s; revoking all of their tokens", row.user_id)
+        token_revocations.revoke(db, row.user_id, refresh_tokens=True)
+    return None
+
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> Dict[str, Any]:
+    """Exchange a refresh token for new tokens with current claims"""
+    user_id = _use_refresh_token(db, refresh_token)
+    user = query_principal_users(db).filter(User.id == user_id).first() if user_id else None
+    if user is None or not user.is_active:
+        db.rollback()
+        raise InvalidRefreshToken()
+    return issue_tokens(db, user)
+
+
+def revoke_refresh_token(db: Session, refresh_token: str) -> None:
+    """Log out: revoke the refresh token and the user's current access tokens"""
+    user_id = _use_refresh_token(db, refresh_token)
+    if user_id is None:
+        raise InvalidRefreshToken()
+    token_revocations.revoke(db, user_id)
@@ -0,0 +1,205 @@
+"""Doctor slot availability engine.
+
+``Doctor.availability`` is a JSON document describing the doctor's weekly
+working hours, optionally overridden for specific dates::
+
+    {
+        "slot_minutes": 30,
+        "monday": [{"start": "09:00", "end": "13:00"}, {"start": "14:00", "end": "17:00"}],
+        "tuesday": ["09:00-17:00"],
+        "2024-12-25": []
+    }
+
+Weekday keys may be full names or three letter abbreviations. A date key
+(``YYYY-MM-DD``) replaces the weekly hours for that day; an empty list marks
+the doctor as unavailable. Working hours are expanded into concrete slots and
+booked appointments are subtracted using their ``duration_minutes``, so a
+45 minute appointment at 09:00 also blocks the 09:30 slot.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment
+from app.models.doctor import Doctor
+from app.schemas.doctor import MAX_SLOT_MINUTES
+
+ACTIVE_STATUSES = ["scheduled", "confirmed"]
+DEFAULT_SLOT_MINUTES = 30
+DEFAULT_APPOINTMENT_MINUTES = 30
+MAX_SLOT_RANGE_DAYS = 31
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_WEEKDAY_KEYS = {name: i for i, name in enumerate(WEEKDAYS)}
+_WEEKDAY_KEYS.update({name[:3]: i for i, name in enumerate(WEEKDAYS)})
+
+Interval = Tuple[datetime, datetime]
+
+
+def _parse_clock(value: str) -> time:
+    return datetime.strptime(value.strip(), "%H:%M").time()
+
+
+def _parse_ranges(ranges: Iterable[Any]) -> List[Tuple[time, time]]:
+    parsed = []
+    for item in ranges or []:
+        if isinstance(item, str):
+            start, _, end = item.partition("-")
+        else:
+            start, end = item.get("start", ""), item.get("end", "")
+        try:
+            parsed.append((_parse_clock(start), _parse_clock(end)))
+        except ValueError:
+            continue
+    return parsed
+
+
+def _parse_slot_minutes(value: Any) -> int:
+    # Stored documents predate validation; anything but a sensible length
+    # (a non-positive step would never end the expansion) gets the default
+    if isinstance(value, bool):
+        return DEFAULT_SLOT_MINUTES
+    try:
+        minutes = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return DEFAULT_SLOT_MINUTES
+    return minutes if 0 < minutes <= MAX_SLOT_MINUTES else DEFAULT_SLOT_MINUTES
+
+
+class WorkingHours:
+    """Parsed form of a ``Doctor.availability`` document."""
+
+    def __init__(self, availability: Optional[Dict[str, Any]]):
+        availability = availability or {}
+        self.slot_minutes = _parse_slot_minutes(availability.get("slot_minutes"))
+        self.weekly: Dict[int, List[Tuple[time, time]]] = {}
+        self.overrides: Dict[date, List[Tuple[time, time]]] = {}
+
+        for key, ranges in availability.items():
+            if key == "slot_minutes":
+                continue
+            weekday = _WEEKDAY_KEYS.get(key.lower())
+            if weekday is not None:
+                self.weekly[weekday] = _parse_ranges(ranges)
+                continue
+            try:
+                self.overrides[date.fromisoformat(key)] = _parse_ranges(ranges)
+            except ValueError:
+                continue
+
+    def ranges_for(self, day: date) -> List[Tuple[time, time]]:
+        if day in self.overrides:
+            return self.overrides[day]
+        return self.weekly.get(day.weekday(), [])
+
+    def expand(self, start_date: date, end_date: date) -> List[Interval]:
+        """Expand working hours into ordered slots between two dates (inclusive)."""
+        step = timedelta(minutes=self.slot_minutes)
+        slots = []
+        day = start_date
+        while day <= end_date:
+            for range_start, range_end in sorted(self.ranges_for(day)):
+                cursor = datetime.combine(day, range_start)
+                limit = datetime.combine(day, range_end)
+                while cursor + step <= limit:
+                    slots.append((cursor, cursor + step))
+                    cursor += step
+            day += timedelta(days=1)
+        return slots
+
+
+def appointment_interval(appointment_date: date, appointment_time: time, duration_minutes: Optional[int]) -> Interval:
+    start = datetime.combine(appointment_date, appointment_time)
+    return start, start + timedelta(minutes=duration_minutes or DEFAULT_APPOINTMENT_MINUTES)
+
+
+def get_booked_intervals(
+    db: Session,
+    doctor_ids: Sequence[int],
+    start_date: date,
+    end_date: date,
+    exclude_appointment_id: Optional[int] = None,
+) -> Dict[int, List[Interval]]:
+    """Load active bookings for the given doctors with a single range scan.
+
+    The scan starts a day early so appointments running past midnight still
+    block the first slots of ``start_date``.
+    """
+    if not doctor_ids:
+        return {}
+    query = db.query(
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Appointment.duration_minutes,
+    ).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_date >= start_date - timedelta(days=1),
+        Appointment.appointment_date <= end_date,
+        Appointment.status.in_(ACTIVE_STATUSES),
+    )
+    if exclude_appointment_id is not None:
+        query = query.filter(Appointment.id != exclude_appointment_id)
+
+    booked: Dict[int, List[Interval]] = defaultdict(list)
+    for doctor_id, appointment_date, appointment_time, duration in query:
+        booked[doctor_id].append(appointment_interval(appointment_date, appointment_time, duration))
+    for intervals in booked.values():
+        intervals.sort()
+    return booked
+
+
+def overlaps(interval: Interval, booked: Sequence[Interval]) -> bool:
+    """Return True if ``interval`` overlaps any interval in sorted ``booked``."""
+    start, end = interval
+    # Only bookings starting before our end can overlap; of those, check whether
+    # any still runs past our start. Bookings are short, so walk backwards.
+    for index in range(bisect_left(booked, (end,)) - 1, -1, -1):
+        booked_start, booked_end = booked[index]
+        if booked_end > start:
+            return True
+        if booked_start <= start - timedelta(days=1):
+            break
+    return False
+
+
+def subtract_booked(slots: Iterable[Interval], booked: Sequence[Interval]) -> List[Interval]:
+    return [slot for slot in slots if not overlaps(slot, booked)]
+
+
+def get_free_slots(
+    db: Session,
+    doctors: Sequence[Doctor],
+    start_date: date,
+    end_date: date,
+    not_before: Optional[datetime] = None,
+) -> Dict[int, List[Interval]]:
+    """Return the free slots of each doctor between two dates (inclusive)."""
+    booked = get_booked_intervals(db, [d.id for d in doctors], start_date, end_date)
+    result = {}
+    for doctor in doctors:
+        slots = WorkingHours(doctor.availability).expand(start_date, end_date)
+        if not_before is not None:
+            slots = [slot for slot in slots if slot[0] >= not_before]
+        result[doctor.id] = subtract_booked(slots, booked.get(doctor.id, []))
+    return result
+
+
+def find_conflict(
+    db: Session,
+    doctor_id: int,
+    appointment_date: date,
+    appointment_time: time,
+    duration_minutes: Optional[int] = None,
+    exclude_appointment_id: Optional[int] = None,
+) -> bool:
+    """Check whether a booking would overlap an existing active appointment."""
+    booked = get_booked_intervals(
+        db, [doctor_id], appointment_date, appointment_date + timedelta(days=1),
+        exclude_appointment_id=exclude_appointment_id,
+    )
+    requested = appointment_interval(appointment_date, appointment_time, duration_minutes)
+    return overlaps(requested, booked.get(doctor_id, []))
@@ -0,0 +1,185 @@
+"""Race-free appointment booking.
+
+The old flow checked for a conflicting appointment and then inserted, so two
+requests for the same slot could both pass the check. Bookings now go through
+``reserve_slot`` which:
+
+* serialises bookings for the same doctor and day (an advisory transaction
+  lock on PostgreSQL, the database write lock on SQLite),
+* re-checks for overlapping appointments while holding that lock, and
+* relies on the ``uq_appointments_active_doctor_slot`` partial unique index as
+  the final guard, translating violations into ``SlotUnavailableError``.
+"""
+import uuid
+from bisect import insort
+from datetime import date, timedelta
+from itertools import compress
+from typing import Any, List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.metrics import bookings
+from app.models.appointment import Appointment
+from app.models.doctor import Doctor
+from app.services.availability import (
+    ACTIVE_STATUSES, appointment_interval, find_conflict, get_booked_intervals, overlaps
+)
+
+MAX_BOOKING_ATTEMPTS = 3
+
+
+class SlotUnavailableError(Exception):
+    """Raised when the requested doctor slot is already booked."""
+
+
+def generate_booking_reference() -> str:
+    return f"APPT-{uuid.uuid4().hex[:8].upper()}"
+
+
+def _count_booking(appointment: Appointment, outcome: str) -> None:
+    bookings.inc(booking_source=appointment.booking_source or "unknown", outcome=outcome)
+
+
+def lock_doctor_day(db: Session, doctor_id: int, day: date) -> None:
+    """Serialise bookings for one doctor and day until the transaction ends."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(:doctor_id, :day)"),
+            {"doctor_id": doctor_id, "day": day.toordinal()},
+        )
+    elif dialect == "sqlite":
+        # SQLite has no row locks; a no-op write takes the database write lock
+        # so concurrent bookings queue up behind this transaction.
+        db.execute(text("UPDATE doctors SET id = id WHERE id = :doctor_id"), {"doctor_id": doctor_id})
+    else:
+        db.query(Doctor.id).filter(Doctor.id == doctor_id).with_for_update().first()
+
+
+def reserve_slot(db: Session, appointment: Appointment) -> Appointment:
+    """Insert or reschedule ``appointment`` if its slot is still free.
+
+    Commits on success. On conflict the transaction is rolled back and
+    ``SlotUnavailableError`` is raised.
+    """
+    is_new = appointment.id is None
+    for attempt in range(MAX_BOOKING_ATTEMPTS):
+        if appointment.status in ACTIVE_STATUSES:
+            lock_doctor_day(db, appointment.doctor_id, appointment.appointment_date)
+            if find_conflict(
+                db,
+                appointment.doctor_id,
+                appointment.appointment_date,
+                appointment.appointment_time,
+                appointment.duration_minutes,
+                exclude_appointment_id=appointment.id,
+            ):
+                db.rollback()
+                if is_new:
+                    _count_booking(appointment, "conflict")
+                raise SlotUnavailableError()
+
+        db.add(appointment)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # Either another booking won the unique slot index, or (for new
+            # appointments) the random booking reference collided.
+            if not is_new or find_conflict(
+                db,
+                appointment.doctor_id,
+                appointment.appointment_date,
+                appointment.appointment_time,
+                appointment.duration_minutes,
+            ):
+                if is_new:
+                    _count_booking(appointment, "conflict")
+                raise SlotUnavailableError()
+            if attempt == MAX_BOOKING_ATTEMPTS - 1:
+                raise
+            appointment.booking_reference = generate_booking_reference()
+            continue
+
+        db.refresh(appointment)
+        if is_new:
+            _count_booking(appointment, "booked")
+        return appointment
+
+
+def lock_and_find_conflicts(db: Session, appointments: Sequence[Any]) -> List[bool]:
+    """Check many new appointments at once, in order.
+
+    Takes the booking lock for every (doctor, day) involved, in a fixed order
+    so concurrent batches cannot deadlock, loads their active bookings with
+    one query and reports for each appointment whether it overlaps an
+    existing booking or an earlier, non-conflicting one in the batch. The
+    locks are held until the caller's transaction ends.
+    """
+    active = [a for a in appointments if (a.status or "scheduled") in ACTIVE_STATUSES]
+    if not active:
+        return [False] * len(appointments)
+    for doctor_id, day in sorted({(a.doctor_id, a.appointment_date) for a in active}):
+        lock_doctor_day(db, doctor_id, day)
+    booked = get_booked_intervals(
+        db,
+        sorted({a.doctor_id for a in active}),
+        min(a.appointment_date for a in active),
+        max(a.appointment_date for a in active) + timedelta(days=1),
+    )
+
+    conflicts = []
+    for appointment in appointments:
+        if (appointment.status or "scheduled") not in ACTIVE_STATUSES:
+            conflicts.append(False)
+            continue
+        interval = appointment_interval(
+            appointment.appointment_date, appointment.appointment_time, appointment.duration_minutes
+        )
+        intervals = booked.setdefault(appointment.doctor_id, [])
+        conflict = overlaps(interval, intervals)
+        if not conflict:
+            insort(intervals, interval)
+        conflicts.append(conflict)
+    return conflicts
+
+
+def reserve_slots(db: Session, appointments: List[Appointment], atomic: bool = True) -> List[bool]:
+    """Insert many new appointments in one transaction.
+
+    All slots are checked with ``lock_and_find_conflicts`` (one query for
+    the whole batch, including overlaps within it). If ``atomic``, nothing is
+    booked when any slot is taken; otherwise the free ones are booked.
+    Returns whether each appointment conflicted; the booked ones are
+    committed and loaded with a single query.
+    """
+    for attempt in range(MAX_BOOKING_ATTEMPTS):
+        conflicts = lock_and_find_conflicts(db, appointments)
+        booked = [a for a, conflict in zip(appointments, conflicts) if not conflict]
+        if not booked or (atomic and any(conflicts)):
+            db.rollback()
+            for appointment in compress(appointments, conflicts):
+                _count_booking(appointment, "conflict")
+            return conflicts
+
+        db.add_all(booked)
+        try:
+            db.flush()
+            ids = [a.id for a in booked]
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            # The slot index caught a concurrent booking (seen by the next
+            # check) or a booking reference collided; retry with new ones
+            if attempt == MAX_BOOKING_ATTEMPTS - 1:
+                raise
+            for appointment in booked:
+                appointment.booking_reference = generate_booking_reference()
+            continue
+
+        db.query(Appointment).filter(Appointment.id.in_(ids)).all()
+        for appointment, conflict in zip(appointments, conflicts):
+            _count_booking(appointment, "conflict" if conflict else "booked")
+        return conflicts
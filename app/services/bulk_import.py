@@ -0,0 +1,210 @@
+"""Bulk import of doctors, patients and appointments.
+
+Records arrive as a JSON array or as CSV (``Content-Type: text/csv``). CSV
+bodies are parsed while they stream in, so an upload is never held in memory
+as a whole. Records are validated with the same schemas as the single-row
+endpoints and inserted ``BULK_IMPORT_CHUNK_SIZE`` at a time with one
+executemany ``INSERT`` and one commit per chunk. Invalid rows are reported
+with their 1-based row number and skipped; the rest of the import continues.
+If a chunk hits a constraint violation it is retried row by row inside
+savepoints so only the offending rows are rejected.
+"""
+import codecs
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.logging import logger
+from app.schemas.bulk_import import BulkImportResult, BulkRowError
+
+BULK_IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+# Checks a chunk of validated records; returns an error message (or None) per record
+ChunkCheck = Callable[[Session, List[BaseModel]], List[Optional[str]]]
+
+
+def _csv_value(value: str) -> Any:
+    value = value.strip()
+    if value[:1] in ("{", "["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+async def _iter_csv(request: Request) -> AsyncIterator[Dict[str, Any]]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    header: Optional[List[str]] = None
+    buffer = ""
+    pending = ""
+
+    def records(lines: List[str]):
+        nonlocal header, pending
+        for line in lines:
+            pending += line + "\n"
+            # A quoted field may contain newlines; wait for its closing quote
+            if pending.count('"') % 2:
+                continue
+            values = next(csv.reader(io.StringIO(pending)), [])
+            pending = ""
+            if not any(v.strip() for v in values):
+                continue
+            if header is None:
+                header = [v.strip() for v in values]
+                continue
+            # Empty cells fall back to the schema defaults
+            yield {name: _csv_value(v) for name, v in zip(header, values) if v.strip()}
+
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for record in records([line.rstrip("\r") for line in lines]):
+            yield record
+    buffer += decoder.decode(b"", final=True)
+    for record in records([buffer.rstrip("\r")] if buffer else []):
+        yield record
+
+
+async def iter_records(request: Request) -> AsyncIterator[Dict[str, Any]]:
+    """Records of a bulk request body: a JSON array, or CSV with a header row"""
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        async for record in _iter_csv(request):
+            yield record
+        return
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+    for record in records:
+        yield record if isinstance(record, dict) else {}
+
+
+async def iter_chunks(
+    records: AsyncIterator[Dict[str, Any]], size: int = BULK_IMPORT_CHUNK_SIZE
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def existing_ids(db: Session, column: Any, ids: Any) -> set:
+    """The subset of ``ids`` present in ``column``, with one query"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    return {value for value, in db.query(column).filter(column.in_(ids))}
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+class BulkImporter:
+    """Validates and inserts chunks of records for one model"""
+
+    def __init__(
+        self,
+        db: Session,
+        model: Any,
+        schema: Type[BaseModel],
+        prepare: Callable[[BaseModel], Dict[str, Any]],
+        check: Optional[ChunkCheck] = None,
+        on_insert: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        self.db = db
+        self.model = model
+        self.schema = schema
+        self.prepare = prepare
+        self.check = check
+        self.on_insert = on_insert
+        self.received = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[BulkRowError] = []
+
+    def _reject(self, row: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(BulkRowError(row=row, error=message))
+
+    def _reject_all(self, rejected: List[Tuple[int, str]]) -> None:
+        # In row order, whichever stage rejected them
+        for row, message in sorted(rejected):
+            self._reject(row, message)
+
+    def _check(self, valid: List[Tuple[int, BaseModel]]) -> Tuple[List[Tuple[int, BaseModel]], List[Tuple[int, str]]]:
+        if not self.check:
+            return valid, []
+        problems = self.check(self.db, [item for _, item in valid])
+        accepted = [pair for pair, problem in zip(valid, problems) if not problem]
+        rejected = [(row, problem) for (row, _), problem in zip(valid, problems) if problem]
+        return accepted, rejected
+
+    def import_chunk(self, records: List[Dict[str, Any]]) -> None:
+        first_row = self.received + 1
+        self.received += len(records)
+
+        valid: List[Tuple[int, BaseModel]] = []
+        invalid: List[Tuple[int, str]] = []
+        for row, record in enumerate(records, start=first_row):
+            try:
+                valid.append((row, self.schema(**record)))
+            except ValidationError as e:
+                invalid.append((row, _validation_message(e)))
+        if not valid:
+            self._reject_all(invalid)
+            return
+
+        accepted, rejected = self._check(valid)
+        rows = [(row, self.prepare(item)) for row, item in accepted]
+        try:
+            if rows:
+                self.db.execute(insert(self.model), [mapping for _, mapping in rows])
+            self.db.commit()
+            inserted = [mapping for _, mapping in rows]
+        except IntegrityError:
+            self.db.rollback()
+            # Redo the chunk row by row in savepoints (re-running the checks,
+            # which may hold locks) so only the conflicting rows are rejected
+            accepted, rejected = self._check(valid)
+            inserted = []
+            for row, item in accepted:
+                mapping = self.prepare(item)
+                try:
+                    with self.db.begin_nested():
+                        self.db.execute(insert(self.model), [mapping])
+                    inserted.append(mapping)
+                except IntegrityError as e:
+                    # The driver's message names constraints and may quote values
+                    logger.info("Bulk import of %s row %d rejected: %s", self.model.__tablename__, row, e.orig)
+                    rejected.append((row, "Conflicts with an existing record"))
+            self.db.commit()
+
+        self._reject_all(invalid + rejected)
+        self.created += len(inserted)
+        if self.on_insert and inserted:
+            self.on_insert(inserted)
+
+    def result(self) -> BulkImportResult:
+        return BulkImportResult(
+            received=self.received, created=self.created, failed=self.failed, errors=self.errors
+        )
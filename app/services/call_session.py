@@ -0,0 +1,213 @@
+"""Per-call state for the voice booking flow.
+
+Twilio sends the same ``CallSid`` with every webhook of a call, so the flow
+keeps the resolved patient, selections made so far and the candidate lists
+read to the caller in a ``CallSession`` keyed by it, instead of threading IDs
+through TwiML ``action`` query strings and re-querying on every turn.
+
+Two stores are available (``CALL_SESSION_BACKEND``):
+
+* ``memory``: an in-process LRU with a TTL. Enough for a single worker.
+* ``redis``: JSON documents with a TTL, shared by all workers. Uses
+  ``REDIS_URL`` with the ``redis`` package; without a URL a local in-process
+  stand-in with the same interface is used, for development and tests.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import logger
+
+# Booking questions in the order they are asked; "go back" moves one step up
+BOOKING_STEPS = ["hospital", "department", "doctor", "date", "time"]
+STEP_FIELDS = {
+    "hospital": ["hospital_id", "hospital_name"],
+    "department": ["department_id", "department_name"],
+    "doctor": ["doctor_id", "doctor_name"],
+    "date": ["date"],
+    "time": [],
+}
+
+
+@dataclass
+class CallSession:
+    call_sid: str
+    phone_number: str = ""
+    patient_id: Optional[int] = None
+    patient_name: Optional[str] = None
+    # Question the caller is currently answering
+    step: Optional[str] = None
+    hospital_id: Optional[int] = None
+    hospital_name: Optional[str] = None
+    department_id: Optional[int] = None
+    department_name: Optional[str] = None
+    doctor_id: Optional[int] = None
+    doctor_name: Optional[str] = None
+    date: Optional[str] = None  # ISO date
+    # (id, name) pairs last read to the caller, keyed by "hospital", "department", "doctor"
+    candidates: Dict[str, List[Tuple[int, str]]] = field(default_factory=dict)
+    # Appointments in the order they were read out for cancellation
+    appointment_ids: List[int] = field(default_factory=list)
+
+    def clear_from(self, step: str) -> None:
+        """Forget the selection for ``step`` and every later booking step"""
+        for later in BOOKING_STEPS[BOOKING_STEPS.index(step):]:
+            for name in STEP_FIELDS[later]:
+                setattr(self, name, None)
+            if later != step:
+                # Later candidate lists depend on the selection being cleared
+                self.candidates.pop(later, None)
+
+    def reset_booking(self) -> None:
+        self.clear_from(BOOKING_STEPS[0])
+        self.step = None
+        self.candidates = {}
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, data: str) -> "CallSession":
+        values = json.loads(data)
+        values["candidates"] = {
+            kind: [tuple(pair) for pair in pairs] for kind, pairs in values.get("candidates", {}).items()
+        }
+        return cls(**values)
+
+
+class InMemoryCallSessionStore:
+    """LRU of sessions in this process; entries expire ``ttl`` seconds after the last save"""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Tuple[float, CallSession]]" = OrderedDict()
+
+    async def get(self, call_sid: str) -> Optional[CallSession]:
+        with self._lock:
+            entry = self._sessions.get(call_sid)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at < time.monotonic():
+                del self._sessions[call_sid]
+                return None
+            self._sessions.move_to_end(call_sid)
+            return session
+
+    async def save(self, session: CallSession) -> None:
+        with self._lock:
+            self._sessions[session.call_sid] = (time.monotonic() + self.ttl, session)
+            self._sessions.move_to_end(session.call_sid)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+
+    async def delete(self, call_sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(call_sid, None)
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of ``redis.asyncio.Redis`` used here"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisCallSessionStore:
+    """Sessions as JSON in Redis so every worker sees the same call state"""
+
+    key_prefix = "call_session:"
+
+    def __init__(self, client: Any, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    async def get(self, call_sid: str) -> Optional[CallSession]:
+        data = await self.client.get(self.key_prefix + call_sid)
+        if data is None:
+            return None
+        if isinstance(data, bytes):
+            data = data.decode()
+        return CallSession.from_json(data)
+
+    async def save(self, session: CallSession) -> None:
+        await self.client.set(self.key_prefix + session.call_sid, session.to_json(), ex=self.ttl)
+
+    async def delete(self, call_sid: str) -> None:
+        await self.client.delete(self.key_prefix + call_sid)
+
+
+def create_call_session_store():
+    ttl = settings.CALL_SESSION_TTL_SECONDS
+    if settings.CALL_SESSION_BACKEND == "redis":
+        if settings.REDIS_URL:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                raise RuntimeError("CALL_SESSION_BACKEND=redis with REDIS_URL requires the 'redis' package")
+            client = redis.from_url(settings.REDIS_URL)
+        else:
+            logger.warning("REDIS_URL is not set; using an in-process stand-in for call sessions")
+            client = LocalRedis()
+        return RedisCallSessionStore(client, ttl)
+    return InMemoryCallSessionStore(ttl, settings.CALL_SESSION_MAX_ENTRIES)
+
+
+_store = None
+
+
+def get_call_session_store():
+    global _store
+    if _store is None:
+        _store = create_call_session_store()
+    return _store
+
+
+@asynccontextmanager
+async def call_session(form_data: Any, **fallbacks: Any) -> AsyncIterator[CallSession]:
+    """Load the session for the webhook's CallSid and save it after the step succeeds.
+
+    ``fallbacks`` (e.g. ``hospital_id`` from an older TwiML action URL) only fill
+    fields the session does not already have. Requests without a CallSid get a
+    throwaway session.
+    """
+    call_sid = form_data.get("CallSid", "")
+    store = get_call_session_store()
+    session = await store.get(call_sid) if call_sid else None
+    if session is None:
+        session = CallSession(call_sid=call_sid, phone_number=form_data.get("From", ""))
+    for name, value in fallbacks.items():
+        if value is not None and getattr(session, name) is None:
+            setattr(session, name, value)
+
+    yield session
+
+    if call_sid:
+        await store.save(session)
@@ -0,0 +1,181 @@
+"""Read-through cache for hospitals, departments and doctors.
+
+The catalogue changes rarely but is read by the catalogue endpoints and on
+every voice turn. Each hospital is cached as a ``HospitalSnapshot``: the
+hospital and all of its departments and doctors, serialised with the API
+schemas. Snapshots expire after ``CATALOGUE_CACHE_TTL_SECONDS`` and are
+invalidated explicitly by the endpoints that write to the catalogue.
+
+Invalidation bumps a per-hospital version (``invalidate_all`` a generation
+shared by every hospital, cached or not), so a snapshot loaded concurrently
+with a write carries the old version and is never stored or served. The cache
+is per process; with several workers the TTL bounds how stale other workers
+can be.
+"""
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.department import Department
+from app.models.doctor import Doctor
+from app.models.hospital import Hospital
+from app.schemas.department import Department as DepartmentSchema
+from app.schemas.doctor import Doctor as DoctorSchema
+from app.schemas.hospital import Hospital as HospitalSchema
+
+
+class HospitalSnapshot(NamedTuple):
+    generation: int
+    version: int
+    loaded_at: float
+    hospital: Dict[str, Any]
+    # Active and inactive, ordered by id
+    departments: List[Dict[str, Any]]
+    doctors: List[Dict[str, Any]]
+
+
+class CatalogueCache:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshots: Dict[int, HospitalSnapshot] = {}
+        self._versions: Dict[int, int] = {}
+        # Bumped by invalidate_all; snapshots and the id list of an older one are stale
+        self._generation = 0
+        # (loaded_at, generation, hospital ids) for listing every hospital
+        self._hospital_ids: Optional[Tuple[float, int, List[int]]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self, loaded_at: float) -> bool:
+        return time.monotonic() - loaded_at < self.ttl
+
+    def _is_current(self, snapshot: HospitalSnapshot) -> bool:
+        return (snapshot.generation == self._generation
+                and snapshot.version == self._versions.get(snapshot.hospital["id"], 0))
+
+    def _cached(self, hospital_id: int) -> Optional[HospitalSnapshot]:
+        snapshot = self._snapshots.get(hospital_id)
+        if snapshot and self._is_current(snapshot) and self._is_fresh(snapshot.loaded_at):
+            return snapshot
+        return None
+
+    def _cached_ids(self) -> Optional[List[int]]:
+        entry = self._hospital_ids
+        if entry and entry[1] == self._generation and self._is_fresh(entry[0]):
+            return entry[2]
+        return None
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _load(self, db: Session, hospital_ids: List[int]) -> Dict[int, HospitalSnapshot]:
+        """Load snapshots for ``hospital_ids`` with one query per table"""
+        with self._lock:
+            generation = self._generation
+            versions = {hospital_id: self._versions.get(hospital_id, 0) for hospital_id in hospital_ids}
+        hospitals = db.query(Hospital).filter(Hospital.id.in_(hospital_ids)).all()
+        departments = db.query(Department).filter(
+            Department.hospital_id.in_(hospital_ids)
+        ).order_by(Department.id).all()
+        doctors = db.query(Doctor).filter(Doctor.hospital_id.in_(hospital_ids)).order_by(Doctor.id).all()
+
+        loaded_at = time.monotonic()
+        snapshots = {
+            hospital.id: HospitalSnapshot(
+                generation, versions[hospital.id], loaded_at, HospitalSchema.from_orm(hospital).dict(), [], []
+            )
+            for hospital in hospitals
+        }
+        for department in departments:
+            snapshots[department.hospital_id].departments.append(DepartmentSchema.from_orm(department).dict())
+        for doctor in doctors:
+            snapshots[doctor.hospital_id].doctors.append(DoctorSchema.from_orm(doctor).dict())
+
+        with self._lock:
+            # Not if a write invalidated them while loading; they are still returned to this caller
+            self._snapshots.update(
+                (hospital_id, snapshot) for hospital_id, snapshot in snapshots.items() if self._is_current(snapshot)
+            )
+        return snapshots
+
+    def get(self, db: Session, hospital_id: int) -> Optional[HospitalSnapshot]:
+        """Snapshot for one hospital, or None if it does not exist"""
+        with self._lock:
+            snapshot = self._cached(hospital_id)
+        self._record(snapshot is not None)
+        if snapshot is None:
+            snapshot = self._load(db, [hospital_id]).get(hospital_id)
+        return snapshot
+
+    def get_all(self, db: Session) -> List[HospitalSnapshot]:
+        """Snapshots for every hospital, ordered by id"""
+        with self._lock:
+            hospital_ids = self._cached_ids()
+            generation = self._generation
+            snapshots = {}
+            if hospital_ids is not None:
+                snapshots = {hospital_id: self._cached(hospital_id) for hospital_id in hospital_ids}
+        missing = [hospital_id for hospital_id, snapshot in snapshots.items() if snapshot is None]
+        self._record(hospital_ids is not None and not missing)
+
+        if hospital_ids is None:
+            hospital_ids = [hospital_id for hospital_id, in db.query(Hospital.id).order_by(Hospital.id)]
+            with self._lock:
+                self._hospital_ids = (time.monotonic(), generation, hospital_ids)
+            missing = hospital_ids
+        if missing:
+            snapshots.update(self._load(db, missing))
+        return [snapshots[hospital_id] for hospital_id in hospital_ids if snapshots.get(hospital_id)]
+
+    def peek(self, hospital_id: int) -> Optional[HospitalSnapshot]:
+        """Cached snapshot without touching the database (for async callers)"""
+        with self._lock:
+            snapshot = self._cached(hospital_id)
+        if snapshot is not None:
+            self._record(True)
+        return snapshot
+
+    def peek_all(self) -> Optional[List[HospitalSnapshot]]:
+        with self._lock:
+            hospital_ids = self._cached_ids()
+            if hospital_ids is None:
+                return None
+            snapshots = [self._cached(hospital_id) for hospital_id in hospital_ids]
+        if None in snapshots:
+            return None
+        self._record(True)
+        return snapshots
+
+    def invalidate_hospital(self, hospital_id: int) -> None:
+        """Call after changing a hospital or any of its departments or doctors"""
+        with self._lock:
+            self._versions[hospital_id] = self._versions.get(hospital_id, 0) + 1
+            self._snapshots.pop(hospital_id, None)
+
+    def invalidate_all(self) -> None:
+        """Call after hospitals are created or deleted"""
+        with self._lock:
+            self._generation += 1
+            self._hospital_ids = None
+            self._snapshots.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "hospitals_cached": len(self._snapshots),
+            }
+
+
+catalogue_cache = CatalogueCache(ttl=settings.CATALOGUE_CACHE_TTL_SECONDS)
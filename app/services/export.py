@@ -0,0 +1,53 @@
+"""Streaming NDJSON / CSV encoding of query results.
+
+Rows are fetched in batches of ``EXPORT_BATCH_SIZE`` with ``yield_per`` (a
+server-side cursor on PostgreSQL) and each batch is encoded into one chunk,
+so memory stays constant however many rows are exported.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Iterator, List
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _encode_ndjson(names: List[str], rows: List[Any]) -> str:
+    return "".join(
+        json.dumps({name: _plain(value) for name, value in zip(names, row)}) + "\n" for row in rows
+    )
+
+
+def _encode_csv(rows: List[Any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+def iter_export(query, names: List[str], export_format: str) -> Iterator[str]:
+    """Encoded chunks for ``query``, which must select the columns ``names`` in order"""
+    if export_format == "csv":
+        yield _encode_csv([names])
+
+    batch = []
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == EXPORT_BATCH_SIZE:
+            yield _encode_csv(batch) if export_format == "csv" else _encode_ndjson(names, batch)
+            batch = []
+    if batch:
+        yield _encode_csv(batch) if export_format == "csv" else _encode_ndjson(names, batch)
@@ -0,0 +1,286 @@
+"""LLM client used by the voice assistant.
+
+Every completion goes through ``LLMClient`` which wraps a pluggable backend
+with the protections a live phone call needs:
+
+* a per-call deadline covering queueing, retries and hedging,
+* a bounded semaphore capping concurrent requests per worker,
+* retries with exponential backoff and full jitter inside the deadline,
+* an optional hedged second request when the first is slow, and
+* a circuit breaker that fails fast while the provider is unhealthy.
+
+``FakeLLMBackend`` answers locally and is selected with ``LLM_BACKEND=fake``
+for tests and offline development.
+"""
+import asyncio
+import random
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+import openai
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import llm_errors, llm_request_duration
+from app.core.request_stats import current_request_stats
+
+RETRY_BACKOFF_BASE_SECONDS = 0.1
+RETRY_BACKOFF_MAX_SECONDS = 1.0
+
+
+class LLMError(Exception):
+    """The completion could not be obtained."""
+
+
+class LLMTimeoutError(LLMError):
+    """The completion did not finish within its deadline."""
+
+
+class LLMUnavailableError(LLMError):
+    """The circuit breaker is open; the provider is not being called."""
+
+
+class LLMBackend:
+    """Provider interface: turn a prompt into completion text."""
+
+    async def complete(self, prompt: str, max_tokens: int) -> str:
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    def __init__(self, api_key: Optional[str], model: str):
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+
+    async def complete(self, prompt: str, max_tokens: int) -> str:
+        if hasattr(openai, "AsyncOpenAI"):
+            # openai>=1.0; retries are handled by LLMClient
+            if self._client is None:
+                self._client = openai.AsyncOpenAI(api_key=self.api_key, max_retries=0)
+            completion = await self._client.completions.create(
+                model=self.model, prompt=prompt, max_tokens=max_tokens
+            )
+        else:
+            completion = await openai.Completion.acreate(
+                engine=self.model, prompt=prompt, max_tokens=max_tokens, api_key=self.api_key
+            )
+        return completion.choices[0].text.strip()
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic local backend.
+
+    ``responses`` maps a substring of the prompt to the answer, or is a
+    callable receiving the prompt. Prompts are recorded in ``calls``.
+    """
+
+    def __init__(
+        self,
+        responses: Union[Dict[str, str], Callable[[str], str], None] = None,
+        default: str = "",
+        latency: float = 0.0,
+    ):
+        self.responses = responses or {}
+        self.default = default
+        self.latency = latency
+        self.calls: List[str] = []
+
+    async def complete(self, prompt: str, max_tokens: int) -> str:
+        self.calls.append(prompt)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if callable(self.responses):
+            return self.responses(prompt)
+        for fragment, answer in self.responses.items():
+            if fragment in prompt:
+                return answer
+        return self.default
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through after a cooldown."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """End a probe that finished without an outcome (e.g. cancelled), so another can run"""
+        self._probing = False
+
+
+class LLMClient:
+    def __init__(
+        self,
+        backend: LLMBackend,
+        timeout: float = 4.0,
+        max_concurrency: int = 16,
+        max_retries: int = 1,
+        hedge_delay: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_seconds=30.0)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores belong to an event loop; recreate if the loop changed (tests)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def complete(self, prompt: str, *, step: str = "completion", max_tokens: int = 50) -> str:
+        """Return the completion for ``prompt`` or raise ``LLMError``."""
+        started = time.perf_counter()
+        try:
+            return await self._complete(prompt, step, max_tokens)
+        except LLMError as e:
+            reason = {LLMTimeoutError: "timeout", LLMUnavailableError: "circuit_open"}.get(type(e), "failed")
+            llm_errors.inc(step=step, reason=reason)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            llm_request_duration.observe(elapsed, step=step)
+            stats = current_request_stats()
+            if stats is not None:
+                stats.add_llm_call(elapsed)
+
+    async def _complete(self, prompt: str, step: str, max_tokens: int) -> str:
+        # Not closed means this call, if allowed, is the half-open probe
+        probe = self.breaker.state != "closed"
+        if not self.breaker.allow():
+            raise LLMUnavailableError(f"LLM circuit open, skipping {step}")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        attempt = 0
+        # A cancelled probe (the caller hung up) records neither outcome, but
+        # must free the slot or the breaker would never let another through
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    result = await asyncio.wait_for(self._attempt(prompt, max_tokens), remaining)
+                except asyncio.TimeoutError:
+                    self.breaker.record_failure()
+                    logger.warning("LLM %s timed out after %.1fs", step, self.timeout)
+                    raise LLMTimeoutError(f"LLM {step} timed out")
+                except Exception as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        self.breaker.record_failure()
+                        logger.warning("LLM %s failed after %d attempts: %s", step, attempt, e)
+                        raise LLMError(f"LLM {step} failed") from e
+                    # Exponential backoff with full jitter, never sleeping past the deadline
+                    backoff = random.uniform(0, min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_BASE_SECONDS * 2 ** attempt))
+                    await asyncio.sleep(min(backoff, max(deadline - loop.time(), 0)))
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    async def _call(self, prompt: str, max_tokens: int) -> str:
+        async with self._get_semaphore():
+            return await self.backend.complete(prompt, max_tokens)
+
+    async def _attempt(self, prompt: str, max_tokens: int) -> str:
+        if self.hedge_delay is None:
+            return await self._call(prompt, max_tokens)
+
+        # Hedging: if the first request is slow, race a second one and take
+        # whichever succeeds first.
+        tasks = [asyncio.ensure_future(self._call(prompt, max_tokens))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(self._call(prompt, max_tokens)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def create_llm_client() -> LLMClient:
+    if settings.LLM_BACKEND == "fake":
+        backend: LLMBackend = FakeLLMBackend()
+    else:
+        backend = OpenAIBackend(api_key=settings.OPENAI_API_KEY, model=settings.LLM_MODEL)
+    return LLMClient(
+        backend,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        max_retries=settings.LLM_MAX_RETRIES,
+        hedge_delay=settings.LLM_HEDGE_DELAY_SECONDS,
+        breaker=CircuitBreaker(
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_seconds=settings.LLM_CIRCUIT_RESET_SECONDS,
+        ),
+    )
+
+
+_llm_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Process-wide client so the concurrency cap and breaker are shared."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = create_llm_client()
+    return _llm_client
+
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    """Replace the shared client, e.g. with a FakeLLMBackend in tests."""
+    global _llm_client
+    _llm_client = client
@@ -0,0 +1,176 @@
+"""Local fuzzy matching of spoken hospital, department and doctor names.
+
+Speech-to-text rarely returns a name exactly as stored ("saint marys",
+"dr smyth", "heart department"). ``NameIndex`` ranks candidates by comparing
+every token of a candidate's name forms against the spoken tokens, using the
+best of plain string similarity and a phonetic code. Department aliases
+("heart" -> Cardiology) and doctor surname / first-name forms are indexed too.
+
+``match`` returns the winning ID when it is clearly ahead; otherwise it
+returns a shortlist for the LLM to decide between. Indexes are cached by a
+fingerprint of their candidates, so a renamed or added entry builds a new one.
+"""
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+MIN_SCORE = 0.75  # below this the best candidate is not trusted
+MIN_MARGIN = 0.08  # the winner must lead the runner-up by this much
+PHONETIC_WEIGHT = 0.9  # sounding alike counts a little less than spelling alike
+PARTIAL_FORM_WEIGHT = 0.9  # "Smith" alone counts less than "John Smith"
+INDEX_CACHE_SIZE = 256
+
+GENERIC_WORDS = {"the", "of", "and", "dr", "doctor", "hospital", "department", "dept", "clinic",
+                 "center", "centre", "medical", "unit"}
+ABBREVIATIONS = {"st": "saint", "mt": "mount", "gen": "general"}
+DEPARTMENT_ALIASES = {
+    "cardiology": ["heart", "cardiac", "cardio", "cardiologist"],
+    "orthopedics": ["bone", "bones", "joint", "joints", "ortho", "orthopedic", "orthopedist"],
+    "pediatrics": ["children", "child", "kids", "pediatric", "pediatrician"],
+    "dermatology": ["skin", "dermatologist"],
+    "neurology": ["brain", "nerve", "nerves", "neuro", "neurologist"],
+    "ophthalmology": ["eye", "eyes", "vision", "ophthalmologist"],
+    "otolaryngology": ["ent", "ear nose throat", "ent doctor"],
+    "gynecology": ["women", "womens health", "gynae", "gynecologist"],
+    "obstetrics": ["pregnancy", "maternity"],
+    "oncology": ["cancer", "oncologist"],
+    "gastroenterology": ["stomach", "digestive", "gastro", "gastroenterologist"],
+    "psychiatry": ["mental health", "psychiatrist"],
+    "radiology": ["x ray", "xray", "scan", "imaging", "radiologist"],
+    "emergency": ["er", "urgent", "casualty"],
+    "general medicine": ["general physician", "gp", "family medicine"],
+}
+
+PHONETIC_RULES = [
+    (r"mb$", "M"), (r"sch", "SK"), (r"tch", "X"), (r"ph", "F"), (r"ck", "K"), (r"sh|ch", "X"),
+    (r"th", "0"), (r"c(?=[iey])", "S"), (r"c", "K"), (r"q", "K"), (r"dg(?=[iey])", "J"), (r"d", "T"),
+    (r"gh(?![aeiou])", ""), (r"g(?=[iey])", "J"), (r"v", "F"), (r"z", "S"), (r"x", "KS"),
+    (r"(?<=[aeiou])h(?![aeiou])", ""), (r"w(?![aeiou])", ""), (r"y(?![aeiou])", ""),
+]
+SILENT_PREFIXES = [("kn", "n"), ("gn", "n"), ("pn", "n"), ("wr", "r"), ("ae", "e"), ("wh", "w"), ("x", "s")]
+
+
+def phonetic_key(word: str) -> str:
+    """Simplified Metaphone code, e.g. smith/smyth -> SM0, jon/john -> JN"""
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if not word:
+        return ""
+    for prefix, replacement in SILENT_PREFIXES:
+        if word.startswith(prefix):
+            word = replacement + word[len(prefix):]
+            break
+    for pattern, replacement in PHONETIC_RULES:
+        word = re.sub(pattern, replacement, word)
+    # Vowels only matter at the start of a word
+    word = word[0] + re.sub(r"[aeiou]", "", word[1:])
+    return re.sub(r"(.)\1+", r"\1", word.upper())
+
+
+def tokenize(text: str) -> List[str]:
+    text = re.sub(r"'s\b", "s", text.lower())
+    tokens = re.findall(r"[a-z0-9]+", text)
+    return [ABBREVIATIONS.get(token, token) for token in tokens]
+
+
+def _name_tokens(name: str) -> List[str]:
+    tokens = tokenize(name)
+    return [t for t in tokens if t not in GENERIC_WORDS] or tokens
+
+
+class Match(NamedTuple):
+    id: Optional[int]
+    shortlist: List[Tuple[int, str]]
+
+
+class NameIndex:
+    def __init__(self, kind: str, candidates: Iterable[Tuple[int, str]]):
+        self.kind = kind
+        self.candidates = list(candidates)
+        self.names: Dict[int, str] = dict(self.candidates)
+        self.exact: Dict[str, int] = {" ".join(tokenize(name)): cid for cid, name in self.candidates}
+        # (candidate id, weight, [(token, phonetic code)]) for every indexed form
+        self.forms: List[Tuple[int, float, List[Tuple[str, str]]]] = []
+        for cid, name in self.candidates:
+            for weight, tokens in self._forms(name):
+                self.forms.append((cid, weight, [(t, phonetic_key(t)) for t in tokens]))
+
+    def _forms(self, name: str) -> List[Tuple[float, List[str]]]:
+        tokens = _name_tokens(name)
+        forms = [(1.0, tokens)]
+        if self.kind == "doctor" and len(tokens) > 1:
+            forms.append((PARTIAL_FORM_WEIGHT, tokens[-1:]))
+            forms.append((PARTIAL_FORM_WEIGHT, tokens[:1]))
+        elif self.kind == "department":
+            joined = " ".join(tokens)
+            for department, aliases in DEPARTMENT_ALIASES.items():
+                if department in joined:
+                    forms.extend((1.0, tokenize(alias)) for alias in aliases)
+        return forms
+
+    @staticmethod
+    def _token_score(token: str, code: str, spoken: List[Tuple[str, str]]) -> float:
+        best = 0.0
+        for word, word_code in spoken:
+            if word == token:
+                return 1.0
+            score = SequenceMatcher(None, token, word).ratio()
+            if code and word_code:
+                # Short codes ("JN" for john/jane/joan) collide often, so they count less
+                evidence = min(1.0, len(code) / 3)
+                score = max(score, PHONETIC_WEIGHT * evidence * SequenceMatcher(None, code, word_code).ratio())
+            best = max(best, score)
+        return best
+
+    def rank(self, speech: str) -> List[Tuple[float, int]]:
+        """(score, candidate id) pairs, best first"""
+        spoken = [(t, phonetic_key(t)) for t in tokenize(speech)]
+        if not spoken:
+            return []
+        scores: Dict[int, float] = {}
+        for cid, weight, tokens in self.forms:
+            score = weight * sum(self._token_score(t, code, spoken) for t, code in tokens) / len(tokens)
+            scores[cid] = max(scores.get(cid, 0.0), score)
+        return sorted(((score, cid) for cid, score in scores.items()), key=lambda pair: (-pair[0], pair[1]))
+
+    def match(self, speech: str) -> Match:
+        """The matched ID, or None with the candidates the LLM should choose between"""
+        ranked = self.rank(speech)
+        if not ranked or ranked[0][0] < MIN_SCORE:
+            return Match(None, self.candidates)
+        best = ranked[0][0]
+        close = [cid for score, cid in ranked if best - score < MIN_MARGIN]
+        if len(close) == 1:
+            return Match(close[0], [])
+        return Match(None, [(cid, self.names[cid]) for cid in close])
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Map a name returned by the LLM back to an ID"""
+        key = " ".join(tokenize(re.sub(r"^\s*(dr\.?|doctor)\s+", "", name, flags=re.I)))
+        if key in self.exact:
+            return self.exact[key]
+        ranked = self.rank(name)
+        if ranked and ranked[0][0] >= MIN_SCORE:
+            return ranked[0][1]
+        return None
+
+
+_indexes: "OrderedDict[Tuple, NameIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_name_index(kind: str, candidates: Iterable[Tuple[int, str]]) -> NameIndex:
+    """Cached index for ``kind`` ("hospital", "department" or "doctor") over ``candidates``"""
+    key = (kind, tuple(candidates))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = NameIndex(kind, key[1])
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
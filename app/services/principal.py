@@ -0,0 +1,73 @@
+"""The authenticated user, as carried by access tokens.
+
+A ``Principal`` holds what authorization needs (role and the linked doctor,
+patient and managed hospital IDs). It is built from the database when a token
+is issued (login or refresh), embedded in the access token as claims, and
+rebuilt from those claims on every request, so authorizing a request needs no
+query. Access tokens are short-lived; when a user or the doctor / patient /
+hospital linked to one changes, ``token_revocations.revoke`` invalidates
+their outstanding access tokens and the client refreshes to get new claims.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional
+
+from sqlalchemy.orm import Query, Session, joinedload, selectinload
+
+from app.models.user import User
+from app.schemas.token import TokenPayload
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    role: str
+    is_active: bool
+    doctor_id: Optional[int] = None
+    patient_id: Optional[int] = None
+    # Hospitals whose admin_id is this user
+    hospital_ids: FrozenSet[int] = frozenset()
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        """Needs the relationships loaded by ``query_principal_users``"""
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            is_active=bool(user.is_active),
+            doctor_id=user.doctor_profile.id if user.doctor_profile else None,
+            patient_id=user.patient_profile.id if user.patient_profile else None,
+            hospital_ids=frozenset(h.id for h in user.managed_hospitals),
+        )
+
+    @classmethod
+    def from_token(cls, payload: TokenPayload) -> "Principal":
+        # Tokens are only issued to active users; deactivation revokes them
+        return cls(
+            id=payload.sub,
+            email=payload.email,
+            role=payload.role,
+            is_active=True,
+            doctor_id=payload.doctor_id,
+            patient_id=payload.patient_id,
+            hospital_ids=frozenset(payload.hospital_ids),
+        )
+
+    def token_claims(self) -> Dict[str, Any]:
+        """Claims for an access token, besides ``sub``, ``role`` and ``ver``"""
+        return {
+            "email": self.email,
+            "doctor_id": self.doctor_id,
+            "patient_id": self.patient_id,
+            "hospital_ids": sorted(self.hospital_ids),
+        }
+
+
+def query_principal_users(db: Session) -> Query:
+    """Users with the relationships ``Principal.from_user`` reads"""
+    return db.query(User).options(
+        joinedload(User.doctor_profile),
+        joinedload(User.patient_profile),
+        selectinload(User.managed_hospitals),
+    )
@@ -0,0 +1,132 @@
+"""Revocation of access tokens without a per-request query.
+
+Every user has a ``token_version``; access tokens carry the version they were
+issued at (``ver``). ``revoke`` bumps the version, so every access token issued
+before it is rejected, and optionally revokes the user's refresh tokens too.
+
+Each process keeps the versions of users revoked within the last
+``ACCESS_TOKEN_EXPIRE_MINUTES`` in memory: older revocations only concern
+tokens that have expired anyway, so the set stays small. Revocations made by
+this process apply immediately; those made by other workers are picked up by
+polling ``users.tokens_revoked_at`` every ``TOKEN_REVOCATION_SYNC_SECONDS``,
+one query per interval rather than one per request.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.session import SessionLocal
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+
+# Re-read this much before the previous poll, covering commits that were in
+# flight during it and clock differences between workers
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class TokenRevocationList:
+    def __init__(self, retention: timedelta, sync_interval: int):
+        self.retention = retention
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # user id -> (token_version, tokens_revoked_at)
+        self._versions: Dict[int, Tuple[int, datetime]] = {}
+        self._synced_until: Optional[datetime] = None
+        self._next_sync = 0.0
+        self.syncs = 0
+        self.rejected = 0
+
+    def is_revoked(self, user_id: int, version: int) -> bool:
+        """Whether an access token for ``user_id`` issued at ``version`` was revoked"""
+        self._maybe_sync()
+        entry = self._versions.get(user_id)
+        if entry is not None and version < entry[0]:
+            with self._lock:
+                self.rejected += 1
+            return True
+        return False
+
+    def _maybe_sync(self) -> None:
+        if time.monotonic() < self._next_sync:
+            return
+        # Until the first sync has loaded the recent revocations, wait for it;
+        # afterwards one request polls while the others carry on
+        if not self._sync_lock.acquire(blocking=self._synced_until is None):
+            return
+        try:
+            if time.monotonic() >= self._next_sync:
+                self.sync()
+        except Exception as e:
+            logger.warning("Token revocation sync failed: %s", e)
+        finally:
+            self._next_sync = time.monotonic() + self.sync_interval
+            self._sync_lock.release()
+
+    def sync(self) -> None:
+        """Load revocations made since the last sync (by any worker)"""
+        now = datetime.utcnow()
+        since = self._synced_until - SYNC_OVERLAP if self._synced_until else now - self.retention
+        db = SessionLocal()
+        try:
+            rows = db.query(User.id, User.token_version, User.tokens_revoked_at).filter(
+                User.tokens_revoked_at >= since
+            ).all()
+        finally:
+            db.close()
+        self._apply(rows)
+        with self._lock:
+            cutoff = now - self.retention
+            for user_id in [user_id for user_id, (_, revoked_at) in self._versions.items() if revoked_at < cutoff]:
+                del self._versions[user_id]
+            self._synced_until = now
+            self.syncs += 1
+
+    def _apply(self, rows: Iterable[Tuple[int, int, datetime]]) -> None:
+        with self._lock:
+            for user_id, version, revoked_at in rows:
+                current = self._versions.get(user_id)
+                if current is None or version > current[0]:
+                    self._versions[user_id] = (version, revoked_at)
+
+    def revoke(self, db: Session, *user_ids: Optional[int], refresh_tokens: bool = False) -> None:
+        """
+        Reject the access tokens issued so far to ``user_ids`` (None values are
+        ignored) and commit. Clients get tokens with up-to-date claims by
+        refreshing, unless ``refresh_tokens`` also revokes those, which forces
+        a new login.
+        """
+        ids = sorted({user_id for user_id in user_ids if user_id is not None})
+        if not ids:
+            return
+        now = datetime.utcnow()
+        db.query(User).filter(User.id.in_(ids)).update(
+            {User.token_version: User.token_version + 1, User.tokens_revoked_at: now},
+            synchronize_session=False,
+        )
+        if refresh_tokens:
+            db.query(RefreshToken).filter(
+                RefreshToken.user_id.in_(ids), RefreshToken.revoked_at.is_(None)
+            ).update({RefreshToken.revoked_at: now}, synchronize_session=False)
+        db.commit()
+        self._apply(db.query(User.id, User.token_version, User.tokens_revoked_at).filter(User.id.in_(ids)).all())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users_revoked": len(self._versions),
+                "tokens_rejected": self.rejected,
+                "syncs": self.syncs,
+                "synced_until": self._synced_until.isoformat() if self._synced_until else None,
+            }
+
+
+token_revocations = TokenRevocationList(
+    retention=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    sync_interval=settings.TOKEN_REVOCATION_SYNC_SECONDS,
+)
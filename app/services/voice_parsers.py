@@ -0,0 +1,238 @@
+"""Rule-based extractors for common caller answers.
+
+The voice flow used to send every utterance to the LLM, even "tomorrow" or
+"2:30 PM". These parsers resolve the unambiguous cases locally; each returns
+``None`` when the speech is ambiguous or unrecognised so the caller can
+escalate to the model. ``resolve`` records hit/miss counts per step in
+``parser_stats``.
+"""
+import re
+import threading
+from datetime import date, time, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+        "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+        "eighteen", "nineteen"]
+TENS = {"twenty": 20, "thirty": 30, "forty": 40, "fifty": 50}
+ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6,
+            "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10, "eleventh": 11, "twelfth": 12,
+            "thirteenth": 13, "fourteenth": 14, "fifteenth": 15, "sixteenth": 16,
+            "seventeenth": 17, "eighteenth": 18, "nineteenth": 19, "twentieth": 20,
+            "thirtieth": 30}
+
+MONTHS = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8,
+          "sep": 9, "oct": 10, "nov": 11, "dec": 12}
+MONTH_PATTERN = (r"(january|february|march|april|may|june|july|august|september|october|"
+                 r"november|december|jan|feb|mar|apr|jun|jul|aug|sept|sep|oct|nov|dec)")
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+INTENT_KEYWORDS = {
+    "cancel_appointment": r"\b(cancel|cancell?ation|call off|delete|remove)\b",
+    "check_appointments": r"\b(check|existing|upcoming|status|list|review|what are my|when is my|do i have)\b",
+    "book_appointment": r"\b(book|booking|schedule|new appointment|make an appointment|set up|reserve)\b",
+}
+NEGATION = r"\b(not|don't|dont|never|no)\b"
+NAVIGATION_KEYWORDS = {
+    "restart": r"\b(start (over|again)|restart|begin again|from the (beginning|start))\b",
+    "back": r"\b(go back|back up|previous (question|step)|change (the|my) (hospital|department|doctor|date))\b",
+}
+
+
+def _build_number_words() -> Dict[str, str]:
+    words = {word: str(value) for value, word in enumerate(ONES)}
+    words.update({word: str(value) for word, value in TENS.items()})
+    words.update({word: f"{value}th" for word, value in ORDINALS.items()})
+    for tens_word, tens in TENS.items():
+        for value in range(1, 10):
+            words[f"{tens_word} {ONES[value]}"] = str(tens + value)
+            ordinal = [w for w, v in ORDINALS.items() if v == value][0]
+            words[f"{tens_word} {ordinal}"] = f"{tens + value}th"
+    return words
+
+
+NUMBER_WORDS = _build_number_words()
+# Longest phrases first so "twenty five" wins over "twenty"
+NUMBER_WORDS_RE = re.compile(
+    r"\b(" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")\b"
+)
+
+
+def normalize(speech: str) -> str:
+    """Lowercase, unify am/pm spellings and replace number words with digits"""
+    text = re.sub(r"(?<=[a-z])-(?=[a-z])", " ", speech.lower())
+    text = re.sub(r"(?<![a-z])a\.?\s?m\b\.?", "am", text)
+    text = re.sub(r"(?<![a-z])p\.?\s?m\b\.?", "pm", text)
+    text = re.sub(r"[,.!?;]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return NUMBER_WORDS_RE.sub(lambda m: NUMBER_WORDS[m.group(1)], text)
+
+
+def _single(candidates: List[Any]) -> Optional[Any]:
+    """The only distinct candidate, or None when there are none or they disagree"""
+    distinct = set(candidates)
+    return distinct.pop() if len(distinct) == 1 else None
+
+
+def _month_day(month: str, day: str, year: Optional[str], today: date) -> Optional[date]:
+    try:
+        value = date(int(year) if year else today.year, MONTHS[month[:3]], int(day))
+        if not year and value < today:
+            value = value.replace(year=value.year + 1)
+    except ValueError:
+        return None
+    return value
+
+
+def parse_date(speech: str, today: Optional[date] = None) -> Optional[date]:
+    """Relative dates, weekdays, "June 15th", "15th of June", ISO and M/D dates"""
+    today = today or date.today()
+    text = normalize(speech)
+    candidates = []
+
+    if re.search(r"\bday after tomorrow\b", text):
+        candidates.append(today + timedelta(days=2))
+    elif re.search(r"\btomorrow\b", text):
+        candidates.append(today + timedelta(days=1))
+    if re.search(r"\btoday\b", text):
+        candidates.append(today)
+    for count, unit in re.findall(r"\bin (a|\d{1,2}) (days?|weeks?)\b", text):
+        count = 1 if count == "a" else int(count)
+        candidates.append(today + timedelta(days=count * (7 if unit.startswith("week") else 1)))
+    for weekday in re.findall(r"\b(" + "|".join(WEEKDAYS) + r")\b", text):
+        ahead = (WEEKDAYS.index(weekday) - today.weekday()) % 7 or 7
+        candidates.append(today + timedelta(days=ahead))
+
+    for year, month, day in re.findall(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b", text):
+        try:
+            candidates.append(date(int(year), int(month), int(day)))
+        except ValueError:
+            return None
+    for month, day, year in re.findall(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\b", text):
+        if not 1 <= int(month) <= 12:
+            return None
+        candidates.append(_month_day(list(MONTHS)[int(month) - 1], day, year, today))
+    for month, day, year in re.findall(
+            r"\b" + MONTH_PATTERN + r" (?:the )?(\d{1,2})(?:st|nd|rd|th)?\b(?: (\d{4})\b)?", text):
+        candidates.append(_month_day(month, day, year, today))
+    for day, month, year in re.findall(
+            r"\b(?:the )?(\d{1,2})(?:st|nd|rd|th)? (?:of )?" + MONTH_PATTERN + r"\b(?: (\d{4})\b)?", text):
+        candidates.append(_month_day(month, day, year, today))
+
+    if None in candidates:
+        return None
+    return _single(candidates)
+
+
+def _clock(hour: int, minute: int, meridiem: str) -> Optional[time]:
+    if not (1 <= hour <= 12 and 0 <= minute <= 59):
+        return None
+    if meridiem in ("pm", "in the afternoon", "in the evening", "at night"):
+        hour = hour % 12 + 12
+    else:
+        hour = hour % 12
+    return time(hour, minute)
+
+
+def parse_time(speech: str) -> Optional[time]:
+    """Times with an explicit meridiem ("2:30 PM", "two thirty in the afternoon"), noon or 24h"""
+    text = normalize(speech)
+    meridiem = r"(am|pm|in the morning|in the afternoon|in the evening|at night)\b"
+    candidates = []
+
+    if re.search(r"\b(noon|midday)\b", text):
+        candidates.append(time(12, 0))
+
+    def relative(match):
+        offset = {"half past": 30, "quarter past": 15, "quarter to": -15}[match.group(1)]
+        value = _clock(int(match.group(2)), 0, match.group(3))
+        if value is not None:
+            minutes = value.hour * 60 + offset
+            value = time(minutes // 60, minutes % 60) if 0 <= minutes < 24 * 60 else None
+        candidates.append(value)
+        return " "
+
+    # Consume "half past 2 pm" first so "2 pm" is not matched again below
+    text = re.sub(r"\b(half past|quarter past|quarter to) (\d{1,2}) ?(?:o'?clock )?" + meridiem,
+                  relative, text)
+    for hour, minute, period in re.findall(
+            r"\b(\d{1,2})(?:[: ](\d{2}))? ?(?:o'?clock )?" + meridiem, text):
+        candidates.append(_clock(int(hour), int(minute or 0), period))
+    if not candidates:
+        # 24-hour clock only when it cannot be a 12-hour time missing am/pm
+        for hour, minute in re.findall(r"\b(\d{1,2}):(\d{2})\b", text):
+            if hour.startswith("0") or 13 <= int(hour) <= 23:
+                candidates.append(time(int(hour), int(minute)) if int(minute) < 60 else None)
+            else:
+                return None
+
+    if None in candidates:
+        return None
+    return _single(candidates)
+
+
+def parse_number(speech: str) -> Optional[int]:
+    """A single small number: "2", "two", "number two", "the second one" """
+    text = normalize(speech)
+    ordinals = re.findall(r"\b(\d{1,2})(?:st|nd|rd|th)\b", text)
+    if ordinals:
+        return _single([int(value) for value in ordinals])
+    return _single([int(value) for value in re.findall(r"\b(\d{1,2})\b", text)])
+
+
+def parse_intent(speech: str) -> Optional[str]:
+    """book_appointment, check_appointments or cancel_appointment from keywords"""
+    text = normalize(speech)
+    if re.search(NEGATION, text):
+        return None
+    matched = [intent for intent, pattern in INTENT_KEYWORDS.items() if re.search(pattern, text)]
+    # "cancel my existing appointment" is a cancellation, not a check
+    if "cancel_appointment" in matched and "book_appointment" not in matched:
+        return "cancel_appointment"
+    return matched[0] if len(matched) == 1 else None
+
+
+def parse_navigation(speech: str) -> Optional[str]:
+    """"restart" or "back" when the caller wants to revisit earlier answers"""
+    text = normalize(speech or "")
+    for action, pattern in NAVIGATION_KEYWORDS.items():
+        if re.search(pattern, text):
+            return action
+    return None
+
+
+class ParserStats:
+    """Per-step counts of utterances resolved locally vs escalated to the LLM"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def record(self, step: str, hit: bool) -> None:
+        counter = self.hits if hit else self.misses
+        with self._lock:
+            counter[step] = counter.get(step, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            steps = sorted(set(self.hits) | set(self.misses))
+            result = {}
+            for step in steps:
+                hits, misses = self.hits.get(step, 0), self.misses.get(step, 0)
+                result[step] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 4),
+                }
+            return result
+
+
+parser_stats = ParserStats()
+
+
+def resolve(step: str, parser: Callable[..., Any], speech: Optional[str], **kwargs) -> Any:
+    """Run ``parser`` on ``speech`` and record whether it avoided an LLM call"""
+    value = parser(speech, **kwargs) if speech else None
+    parser_stats.record(step, value is not None)
+    return value